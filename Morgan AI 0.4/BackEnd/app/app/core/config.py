@@ -25,6 +25,7 @@ class Settings(BaseSettings):
         default="sqlite:///./morgan_chatbot.db",
         env="DATABASE_URL"
     )
+    CHAT_DB_PATH: str = Field(default="data/chat_threads.db", env="CHAT_DB_PATH")
     
     # Security
     SECRET_KEY: str = Field(default="change_this_secret_key_in_production", env="SECRET_KEY")
@@ -38,6 +39,12 @@ class Settings(BaseSettings):
     OPENAI_EMBEDDING_MODEL: str = Field(default="text-embedding-3-small", env="OPENAI_EMBEDDING_MODEL")
     OPENAI_MAX_TOKENS: int = Field(default=2000, env="OPENAI_MAX_TOKENS")
     OPENAI_TEMPERATURE: float = Field(default=0.7, env="OPENAI_TEMPERATURE")
+    HISTORY_TOKEN_BUDGET: int = Field(default=2048, env="HISTORY_TOKEN_BUDGET")
+    HISTORY_MESSAGE_LIMIT: int = Field(default=50, env="HISTORY_MESSAGE_LIMIT")
+    SUMMARY_REFRESH_MESSAGES: int = Field(default=4, env="SUMMARY_REFRESH_MESSAGES")
+    OPENAI_MAX_CONNECTIONS: int = Field(default=100, env="OPENAI_MAX_CONNECTIONS")
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=50, env="OPENAI_MAX_KEEPALIVE_CONNECTIONS")
+    OPENAI_TIMEOUT: float = Field(default=30.0, env="OPENAI_TIMEOUT")  # connect/pool timeout, seconds
     
     # OpenAI Realtime API
     OPENAI_REALTIME_ENABLED: bool = Field(default=True, env="OPENAI_REALTIME_ENABLED")
@@ -53,6 +60,8 @@ class Settings(BaseSettings):
     PINECONE_INDEX_NAME: str = Field(default="morgan-chatbot", env="PINECONE_INDEX_NAME")
     PINECONE_DIMENSION: int = Field(default=1536, env="PINECONE_DIMENSION")
     PINECONE_METRIC: str = Field(default="cosine", env="PINECONE_METRIC")
+    PINECONE_POOL_THREADS: int = Field(default=30, env="PINECONE_POOL_THREADS")
+    PINECONE_QUERY_TIMEOUT: float = Field(default=1.5, env="PINECONE_QUERY_TIMEOUT")  # seconds
     
     # GroupMe Integration
     GROUPME_BOT_ID: Optional[str] = Field(default=None, env="GROUPME_BOT_ID")
@@ -113,6 +122,8 @@ class Settings(BaseSettings):
     # Cache
     REDIS_URL: Optional[str] = Field(default=None, env="REDIS_URL")
     CACHE_TTL: int = Field(default=3600, env="CACHE_TTL")  # 1 hour
+    LLM_CACHE_MAX_SIZE: int = Field(default=1000, env="LLM_CACHE_MAX_SIZE")
+    LLM_CACHE_SIMILARITY_THRESHOLD: float = Field(default=0.92, env="LLM_CACHE_SIMILARITY_THRESHOLD")
     
     # RAG Configuration
     CHUNK_SIZE: int = Field(default=1000, env="CHUNK_SIZE")
@@ -2,14 +2,15 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 from dotenv import load_dotenv
 
 # Import routers
 from app.api.routes import chat, voice, admin, internship, auth
-from app.services.pinecone_service import PineconeService
-from app.services.openai_service import OpenAIService
+from app.services.pinecone_service import get_pinecone_service
+from app.services.openai_service import get_openai_service
 from app.core.config import settings
 from app.api.middleware.cors import setup_cors, get_cors_config
 
@@ -33,7 +34,7 @@ async def lifespan(app: FastAPI):
     
     # Initialize Pinecone
     try:
-        pinecone_service = PineconeService()
+        pinecone_service = get_pinecone_service()
         app.state.pinecone = pinecone_service
         logger.info("Pinecone service initialized")
     except Exception as e:
@@ -41,16 +42,26 @@ async def lifespan(app: FastAPI):
     
     # Initialize OpenAI
     try:
-        openai_service = OpenAIService()
+        openai_service = get_openai_service()
         app.state.openai = openai_service
         logger.info("OpenAI service initialized")
     except Exception as e:
         logger.error(f"Failed to initialize OpenAI: {e}")
     
+    # Warm up the Pinecone connection used for RAG
+    if hasattr(app.state, 'openai'):
+        try:
+            await asyncio.to_thread(app.state.openai.pinecone_service.warm_up)
+        except Exception as e:
+            logger.warning(f"Pinecone warm-up failed: {e}")
+    
     yield
     
     # Cleanup
     logger.info("Shutting down Morgan AI Chatbot Backend...")
+    if hasattr(app.state, 'openai'):
+        await app.state.openai.thread_manager.close()
+        await app.state.openai.client.close()
     # await websocket_manager.disconnect_all()  # Commented out if not used
 
 # Create FastAPI app
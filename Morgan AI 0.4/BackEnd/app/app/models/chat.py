@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
+import uuid
 
 class MessageRole(str, Enum):
     """Message role enumeration"""
@@ -11,10 +12,10 @@ class MessageRole(str, Enum):
 
 class ChatMessage(BaseModel):
     """Chat message model"""
-    message_id: Optional[str] = Field(None, description="Unique message ID")
+    message_id: str = Field(default_factory=lambda: str(uuid.uuid4()), description="Unique message ID")
     role: MessageRole = Field(..., description="Message role")
     content: str = Field(..., description="Message content")
-    timestamp: Optional[datetime] = Field(None, description="Message timestamp")
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), description="Message timestamp")
     user_id: Optional[str] = Field(None, description="User ID")
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Additional metadata")
     
@@ -2,6 +2,23 @@ from pydantic import BaseModel, Field, EmailStr
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
+from types import MappingProxyType
+
+# Read-only templates for the preference defaults; each instance gets a copy
+_DEFAULT_NOTIFICATION_SETTINGS = MappingProxyType({
+    "email": True,
+    "push": False,
+    "sms": False,
+    "internships": True,
+    "events": True,
+    "deadlines": True
+})
+
+_DEFAULT_CHAT_SETTINGS = MappingProxyType({
+    "save_history": True,
+    "auto_suggestions": True,
+    "quick_questions": True
+})
 
 class UserRole(str, Enum):
     """User role enumeration"""
@@ -54,24 +71,16 @@ class UserPreferences(BaseModel):
     theme: str = Field(default="dark", description="UI theme")
     language: str = Field(default="en", description="Preferred language")
     notification_settings: Dict[str, bool] = Field(
-        default_factory=lambda: {
-            "email": True,
-            "push": False,
-            "sms": False,
-            "internships": True,
-            "events": True,
-            "deadlines": True
-        },
+        default_factory=lambda: dict(_DEFAULT_NOTIFICATION_SETTINGS),
         description="Notification preferences"
     )
     chat_settings: Dict[str, Any] = Field(
-        default_factory=lambda: {
-            "save_history": True,
-            "auto_suggestions": True,
-            "quick_questions": True
-        },
+        default_factory=lambda: dict(_DEFAULT_CHAT_SETTINGS),
         description="Chat preferences"
     )
+    
+    class Config:
+        frozen = True
 
 class UserSession(BaseModel):
     """User session model"""
@@ -83,12 +92,18 @@ class UserSession(BaseModel):
     ip_address: Optional[str] = Field(None, description="Client IP address")
     user_agent: Optional[str] = Field(None, description="Client user agent")
     is_active: bool = Field(default=True, description="Session active status")
+    
+    class Config:
+        frozen = True
 
 class LoginRequest(BaseModel):
     """Login request model"""
     username: str = Field(..., description="Username or email")
     password: str = Field(..., description="Password")
     remember_me: bool = Field(default=False, description="Extended session")
+    
+    class Config:
+        frozen = True
 
 class LoginResponse(BaseModel):
     """Login response model"""
@@ -97,6 +112,9 @@ class LoginResponse(BaseModel):
     expires_in: int = Field(..., description="Token expiration in seconds")
     user: User = Field(..., description="User information")
     preferences: Optional[UserPreferences] = Field(None, description="User preferences")
+    
+    class Config:
+        frozen = True
 
 class RegisterRequest(BaseModel):
     """Registration request model"""
@@ -105,6 +123,9 @@ class RegisterRequest(BaseModel):
     password: str = Field(..., min_length=8, description="Password")
     full_name: Optional[str] = Field(None, description="Full name")
     student_id: Optional[str] = Field(None, description="Student ID")
+    
+    class Config:
+        frozen = True
 
 class PasswordResetRequest(BaseModel):
     """Password reset request model"""
@@ -121,4 +142,7 @@ class UserActivity(BaseModel):
     activity_type: str = Field(..., description="Activity type")
     description: str = Field(..., description="Activity description")
     timestamp: datetime = Field(..., description="Activity timestamp")
-    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Activity metadata")
\ No newline at end of file
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Activity metadata")
+    
+    class Config:
+        frozen = True
\ No newline at end of file
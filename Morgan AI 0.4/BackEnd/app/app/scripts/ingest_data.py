@@ -5,18 +5,27 @@ Processes and stores all knowledge base documents into Pinecone vector database
 import asyncio
 import json
 import logging
+import mmap
+import os
+from collections import deque
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
 import hashlib
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
 import sys
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.core.config import settings
 from app.services.openai_service import OpenAIService
-from app.services.pinecone_service import PineconeService
 from app.services.langchain_service import PineconeService
 
 # Configure logging
@@ -26,13 +35,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Category -> filename keywords, checked in order; first match wins
+_CATEGORIES = {
+    "advising": ["advising", "advisor"],
+    "courses": ["courses", "prerequisites", "programs"],
+    "registration": ["registration", "deadlines", "forms"],
+    "career": ["career", "internship", "organizations", "career_prep"],
+    "resources": ["tech", "tutoring", "locations", "tech_resources"],
+    "people": ["faculty", "staff", "contact", "faculty_staff", "contact_info"]
+}
+
+# Flattened keyword -> category, preserving the priority order above
+_CATEGORY_INDEX = {
+    keyword: category
+    for category, keywords in _CATEGORIES.items()
+    for keyword in keywords
+}
+
+@lru_cache(maxsize=1024)
+def _category_for(filename_lower: str) -> str:
+    """Look up the category for a lowercased filename"""
+    for keyword, category in _CATEGORY_INDEX.items():
+        if keyword in filename_lower:
+            return category
+    return "general"
+
+def _walk_files(root: Path) -> Iterator[os.DirEntry]:
+    """Yield every file under root using os.scandir with an explicit stack"""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+        except OSError as e:
+            logger.warning(f"Cannot scan directory: {str(e)}")
+
+def _read_text(path: Path, size: int) -> str:
+    """Read a UTF-8 file with raw os.read calls, translating newlines like open()"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # The size from the directory walk normally lets one read return the
+        # whole file; only a short read or an unknown size reads on to EOF
+        data = os.read(fd, size)
+        if size == 0 or len(data) < size:
+            chunks = [data]
+            while chunk := os.read(fd, 1 << 16):
+                chunks.append(chunk)
+            data = b"".join(chunks)
+    finally:
+        os.close(fd)
+    
+    content = data.decode('utf-8')
+    return content.replace('\r\n', '\n').replace('\r', '\n')
+
 class KnowledgeBaseIngestor:
     """Ingest Morgan State CS knowledge base data into Pinecone vector database"""
     
     def __init__(self):
         self.openai_service = OpenAIService()
+        # One client serves both index management and document processing
         self.pinecone_service = PineconeService()
-        self.langchain_service = PineconeService()
+        self.langchain_service = self.pinecone_service
         self.knowledge_base_dir = settings.KNOWLEDGE_BASE_DIR
         self.processed_dir = settings.PROCESSED_DIR
         
@@ -42,13 +109,62 @@ class KnowledgeBaseIngestor:
             "documents_created": 0,
             "chunks_generated": 0,
             "vectors_stored": 0,
+            "files_unchanged": 0,
             "errors": []
         }
+        
+        # Content hash and chunk count of each source as of its last
+        # successful ingestion, so unchanged files are not re-embedded and
+        # chunks a changed file no longer has can be deleted
+        self.hash_cache_file = self.processed_dir / "ingest_cache.json"
+        self._hash_cache: Dict[str, Dict[str, Any]] = self._load_hash_cache()
+        
+        # Filename keyword -> specialized JSON processor, checked in order
+        self._json_processors = {
+            "courses": self._process_courses_json,
+            "prerequisites": self._process_prerequisites_json,
+            "faculty": self._process_faculty_json,
+            "deadlines": self._process_deadlines_json,
+            "advising": self._process_advising_json
+        }
+        
+        # Timestamp shared by every document of an ingest_all run
+        self.ingested_at: Optional[str] = None
+        
+        # Files read ahead by the loaders; bounds open file descriptors and
+        # how many loaded documents wait in memory for the consumer
+        self.max_concurrent_files = 32
+        
+        # Loaders log progress every this many files instead of once per file
+        self.log_progress_every = 50
+        
+        # Chunks embedded and upserted together by process_documents
+        self.process_batch_size = 64
+        
+        # Larger error lists go to a JSONL file next to the processing log
+        self.max_inline_errors = 100
+        
+        # (path, stat) per extension, filled by a single directory walk
+        self._files_by_ext: Optional[Dict[str, List[Tuple[Path, os.stat_result]]]] = None
+    
+    def _scan_knowledge_base(self) -> Dict[str, List[Tuple[Path, os.stat_result]]]:
+        """Walk the knowledge base once, grouping JSON and text files with their stat"""
+        if self._files_by_ext is None:
+            files_by_ext = {".json": [], ".txt": []}
+            for entry in _walk_files(self.knowledge_base_dir):
+                ext = os.path.splitext(entry.name)[1]
+                if ext in files_by_ext:
+                    files_by_ext[ext].append((Path(entry.path), entry.stat()))
+            
+            for files in files_by_ext.values():
+                files.sort(key=lambda item: item[0])
+            self._files_by_ext = files_by_ext
+        
+        return self._files_by_ext
     
     async def load_json_files(self) -> List[Dict[str, Any]]:
         """Load and process all JSON files from knowledge base directory"""
-        documents = []
-        json_files = list(self.knowledge_base_dir.glob("*.json"))
+        json_files = self._scan_knowledge_base()[".json"]
         
         logger.info(f"Found {len(json_files)} JSON files to process")
         
@@ -61,189 +177,267 @@ class KnowledgeBaseIngestor:
             "tech_resources.json", "tutoring.json"
         ]
         
-        for json_file in json_files:
-            try:
-                logger.info(f"Processing {json_file.name}...")
-                
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # Convert JSON to structured text based on file type
-                if "courses" in json_file.name:
-                    content = self._process_courses_json(data)
-                elif "prerequisites" in json_file.name:
-                    content = self._process_prerequisites_json(data)
-                elif "faculty" in json_file.name:
-                    content = self._process_faculty_json(data)
-                elif "deadlines" in json_file.name:
-                    content = self._process_deadlines_json(data)
-                elif "advising" in json_file.name:
-                    content = self._process_advising_json(data)
-                else:
-                    # Generic JSON to text conversion
-                    content = self._json_to_text(data)
-                
-                # Create document with rich metadata
-                doc = {
-                    "content": content,
-                    "metadata": {
-                        "source": json_file.name,
-                        "type": json_file.stem,
-                        "category": self._categorize_file(json_file.stem),
-                        "document_id": self._generate_document_id(json_file.stem),
-                        "file_size": json_file.stat().st_size,
-                        "last_modified": datetime.fromtimestamp(json_file.stat().st_mtime).isoformat(),
-                        "content_length": len(content),
-                        "ingested_at": datetime.utcnow().isoformat()
-                    }
-                }
-                documents.append(doc)
-                self.stats["files_processed"] += 1
-                logger.info(f"Successfully loaded {json_file.name} ({len(content)} characters)")
-                
-            except json.JSONDecodeError as e:
-                error_msg = f"JSON decode error in {json_file}: {str(e)}"
-                logger.error(error_msg)
-                self.stats["errors"].append(error_msg)
-            except Exception as e:
-                error_msg = f"Error loading {json_file}: {str(e)}"
-                logger.error(error_msg)
-                self.stats["errors"].append(error_msg)
-        
-        return documents
+        return await self._load_files(json_files, self._load_json_file)
     
     async def load_text_files(self) -> List[Dict[str, Any]]:
         """Load and process text files from knowledge base directory"""
-        documents = []
-        text_files = list(self.knowledge_base_dir.glob("*.txt"))
+        text_files = self._scan_knowledge_base()[".txt"]
         
         logger.info(f"Found {len(text_files)} text files to process")
         
-        for text_file in text_files:
+        return await self._load_files(text_files, self._load_text_file)
+    
+    async def iter_documents(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield validated documents from all knowledge base files as they load"""
+        files_by_ext = self._scan_knowledge_base()
+        
+        for ext, loader in ((".json", self._load_json_file), (".txt", self._load_text_file)):
+            async for doc in self._iter_files(files_by_ext[ext], loader):
+                if self._validate_document(doc):
+                    yield doc
+    
+    async def _load_files(
+        self,
+        files: List[Tuple[Path, os.stat_result]],
+        loader
+    ) -> List[Dict[str, Any]]:
+        """Read and process files concurrently in worker threads, in input order"""
+        return [doc async for doc in self._iter_files(files, loader)]
+    
+    async def _iter_files(
+        self,
+        files: List[Tuple[Path, os.stat_result]],
+        loader
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Load files concurrently, yielding each document in input order once it is ready"""
+        ingested_at = self.ingested_at or datetime.utcnow().isoformat()
+        total = len(files)
+        completed = 0
+        
+        async def load(path: Path, file_stat: os.stat_result) -> Dict[str, Any]:
+            nonlocal completed
             try:
-                logger.info(f"Processing {text_file.name}...")
+                return await asyncio.to_thread(loader, path, file_stat, ingested_at)
+            finally:
+                completed += 1
+                if completed % self.log_progress_every == 0:
+                    logger.info("Processed %d/%d files", completed, total)
+        
+        def schedule(path: Path, file_stat: os.stat_result):
+            window.append((path, asyncio.ensure_future(load(path, file_stat))))
+        
+        # Sliding window of at most max_concurrent_files loads; the next file
+        # is only started once the oldest load finishes, so a slow consumer
+        # does not let every document pile up in memory
+        pending_files = iter(files)
+        window = deque()
+        loaded = 0
+        
+        try:
+            for path, file_stat in islice(pending_files, self.max_concurrent_files):
+                schedule(path, file_stat)
+            
+            while window:
+                path, task = window.popleft()
+                result = None
+                try:
+                    result = await task
+                except json.JSONDecodeError as e:
+                    error_msg = f"JSON decode error in {path}: {str(e)}"
+                except Exception as e:
+                    error_msg = f"Error loading {path}: {str(e)}"
                 
-                with open(text_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                next_file = next(pending_files, None)
+                if next_file is not None:
+                    schedule(*next_file)
                 
-                # Process the training_data.txt specially if it exists
-                if text_file.name == "training_data.txt":
-                    content = self._enhance_training_data(content)
+                if result is None:
+                    logger.error(error_msg)
+                    self.stats["errors"].append(error_msg)
+                    continue
                 
-                # Create document with metadata
-                doc = {
-                    "content": content,
-                    "metadata": {
-                        "source": text_file.name,
-                        "type": "general_knowledge" if text_file.name == "training_data.txt" else "text",
-                        "category": "overview",
-                        "document_id": self._generate_document_id(text_file.stem),
-                        "file_size": text_file.stat().st_size,
-                        "last_modified": datetime.fromtimestamp(text_file.stat().st_mtime).isoformat(),
-                        "content_length": len(content),
-                        "ingested_at": datetime.utcnow().isoformat()
-                    }
-                }
-                documents.append(doc)
+                loaded += 1
                 self.stats["files_processed"] += 1
-                logger.info(f"Successfully loaded {text_file.name} ({len(content)} characters)")
-                
-            except Exception as e:
-                error_msg = f"Error loading {text_file}: {str(e)}"
-                logger.error(error_msg)
-                self.stats["errors"].append(error_msg)
+                logger.debug("Successfully loaded %s (%d characters)", path.name, len(result['content']))
+                yield result
+        finally:
+            # Stop outstanding reads if the consumer stops early
+            for _, task in window:
+                task.cancel()
         
-        return documents
+        logger.info("Loaded %d/%d files", loaded, total)
+    
+    def _load_json_file(
+        self,
+        json_file: Path,
+        file_stat: os.stat_result,
+        ingested_at: str
+    ) -> Dict[str, Any]:
+        """Read one JSON file and convert it to a document"""
+        logger.debug("Processing %s...", json_file.name)
+        
+        # orjson parses straight from a memory-mapped view of the file, with no
+        # copy into the Python heap; its JSONDecodeError subclasses json's
+        if orjson is not None and file_stat.st_size > 0:
+            with open(json_file, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    data = orjson.loads(view)
+        else:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        
+        name = json_file.name
+        stem = json_file.stem
+        relative_path = self._relative_path(json_file)
+        
+        # Convert JSON to structured text based on file type
+        for keyword, processor in self._json_processors.items():
+            if keyword in name:
+                content = processor(data)
+                break
+        else:
+            # Generic JSON to text conversion
+            content = self._json_to_text(data)
+        
+        # Create document with rich metadata
+        return {
+            "content": content,
+            "metadata": {
+                "source": name,
+                "path": relative_path,
+                "type": stem,
+                "category": self._categorize_file(stem),
+                "document_id": self._generate_document_id(relative_path),
+                "file_size": file_stat.st_size,
+                "last_modified": datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
+                "content_length": len(content),
+                "ingested_at": ingested_at
+            }
+        }
+    
+    def _load_text_file(
+        self,
+        text_file: Path,
+        file_stat: os.stat_result,
+        ingested_at: str
+    ) -> Dict[str, Any]:
+        """Read one text file and convert it to a document"""
+        logger.debug("Processing %s...", text_file.name)
+        
+        content = _read_text(text_file, file_stat.st_size)
+        
+        # Process the training_data.txt specially if it exists
+        if text_file.name == "training_data.txt":
+            content = self._enhance_training_data(content)
+        
+        relative_path = self._relative_path(text_file)
+        
+        # Create document with metadata
+        return {
+            "content": content,
+            "metadata": {
+                "source": text_file.name,
+                "path": relative_path,
+                "type": "general_knowledge" if text_file.name == "training_data.txt" else "text",
+                "category": "overview",
+                "document_id": self._generate_document_id(relative_path),
+                "file_size": file_stat.st_size,
+                "last_modified": datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
+                "content_length": len(content),
+                "ingested_at": ingested_at
+            }
+        }
     
     def _process_courses_json(self, data: Dict) -> str:
         """Process courses.json into structured text"""
-        text = "MORGAN STATE UNIVERSITY COMPUTER SCIENCE COURSES\n\n"
+        parts = ["MORGAN STATE UNIVERSITY COMPUTER SCIENCE COURSES\n\n"]
         
         if "courses" in data:
             for course in data["courses"]:
-                text += f"\nCourse Code: {course.get('course_code', 'N/A')}\n"
-                text += f"Title: {course.get('title', 'N/A')}\n"
-                text += f"Credits: {course.get('credits', 'N/A')}\n"
-                text += f"Description: {course.get('description', 'N/A')}\n"
-                text += f"Prerequisites: {', '.join(course.get('prerequisites', ['None']))}\n"
-                text += f"Offered: {', '.join(course.get('offered', ['TBA']))}\n"
-                text += f"Level: {course.get('level', 'N/A')}\n"
-                text += f"Category: {course.get('category', 'N/A')}\n"
-                text += "-" * 50 + "\n"
-        
-        return text
+                parts.append(
+                    f"\nCourse Code: {course.get('course_code', 'N/A')}\n"
+                    f"Title: {course.get('title', 'N/A')}\n"
+                    f"Credits: {course.get('credits', 'N/A')}\n"
+                    f"Description: {course.get('description', 'N/A')}\n"
+                    f"Prerequisites: {', '.join(course.get('prerequisites', ['None']))}\n"
+                    f"Offered: {', '.join(course.get('offered', ['TBA']))}\n"
+                    f"Level: {course.get('level', 'N/A')}\n"
+                    f"Category: {course.get('category', 'N/A')}\n"
+                )
+                parts.append("-" * 50 + "\n")
+        
+        return "".join(parts)
     
     def _process_prerequisites_json(self, data: Dict) -> str:
         """Process prerequisites.json into structured text"""
-        text = "COURSE PREREQUISITES AND REQUIREMENTS\n\n"
+        parts = ["COURSE PREREQUISITES AND REQUIREMENTS\n\n"]
         
         if "course_prerequisites" in data:
             for course_code, info in data["course_prerequisites"].items():
-                text += f"\n{course_code}: {info.get('course_name', 'N/A')}\n"
-                text += f"Credits: {info.get('credits', 'N/A')}\n"
-                text += f"Prerequisites: {', '.join(info.get('prerequisites', ['None']))}\n"
-                text += f"Corequisites: {', '.join(info.get('corequisites', ['None']))}\n"
-                text += f"Description: {info.get('description', 'N/A')}\n"
-                text += "-" * 50 + "\n"
+                parts.append(
+                    f"\n{course_code}: {info.get('course_name', 'N/A')}\n"
+                    f"Credits: {info.get('credits', 'N/A')}\n"
+                    f"Prerequisites: {', '.join(info.get('prerequisites', ['None']))}\n"
+                    f"Corequisites: {', '.join(info.get('corequisites', ['None']))}\n"
+                    f"Description: {info.get('description', 'N/A')}\n"
+                )
+                parts.append("-" * 50 + "\n")
         
-        return text
+        return "".join(parts)
     
     def _process_faculty_json(self, data: Dict) -> str:
         """Process faculty_staff.json into structured text"""
-        text = "MORGAN STATE CS DEPARTMENT FACULTY AND STAFF\n\n"
+        parts = ["MORGAN STATE CS DEPARTMENT FACULTY AND STAFF\n\n"]
         
         if "department_chair" in data:
             chair = data["department_chair"]
-            text += f"Department Chair: {chair.get('name', 'N/A')}\n"
-            text += f"Title: {chair.get('title', 'N/A')}\n"
-            text += f"Office: {chair.get('office', 'N/A')}\n"
-            text += f"Email: {chair.get('email', 'N/A')}\n"
-            text += f"Phone: {chair.get('phone', 'N/A')}\n\n"
+            parts.append(
+                f"Department Chair: {chair.get('name', 'N/A')}\n"
+                f"Title: {chair.get('title', 'N/A')}\n"
+                f"Office: {chair.get('office', 'N/A')}\n"
+                f"Email: {chair.get('email', 'N/A')}\n"
+                f"Phone: {chair.get('phone', 'N/A')}\n\n"
+            )
         
         if "full_time_faculty" in data:
-            text += "FACULTY MEMBERS:\n"
+            parts.append("FACULTY MEMBERS:\n")
             for faculty in data["full_time_faculty"]:
-                text += f"\n{faculty.get('name', 'N/A')}\n"
-                text += f"Title: {faculty.get('title', 'N/A')}\n"
-                text += f"Office: {faculty.get('office', 'N/A')}\n"
-                text += f"Email: {faculty.get('email', 'N/A')}\n"
-                text += f"Office Hours: {faculty.get('office_hours', 'N/A')}\n"
-                text += f"Research: {', '.join(faculty.get('research_interests', []))}\n"
-                text += "-" * 30 + "\n"
+                parts.append(
+                    f"\n{faculty.get('name', 'N/A')}\n"
+                    f"Title: {faculty.get('title', 'N/A')}\n"
+                    f"Office: {faculty.get('office', 'N/A')}\n"
+                    f"Email: {faculty.get('email', 'N/A')}\n"
+                    f"Office Hours: {faculty.get('office_hours', 'N/A')}\n"
+                    f"Research: {', '.join(faculty.get('research_interests', []))}\n"
+                )
+                parts.append("-" * 30 + "\n")
         
-        return text
+        return "".join(parts)
     
     def _process_deadlines_json(self, data: Dict) -> str:
         """Process deadlines.json into structured text"""
-        text = "IMPORTANT ACADEMIC DEADLINES\n\n"
-        
-        if "fall_2024" in data:
-            text += "FALL 2024 SEMESTER:\n"
-            fall = data["fall_2024"]
-            if "registration" in fall:
-                for key, value in fall["registration"].items():
-                    text += f"{key.replace('_', ' ').title()}: {value}\n"
-            if "semester_dates" in fall:
-                text += "\nImportant Dates:\n"
-                for key, value in fall["semester_dates"].items():
-                    text += f"{key.replace('_', ' ').title()}: {value}\n"
-        
-        if "spring_2025" in data:
-            text += "\nSPRING 2025 SEMESTER:\n"
-            spring = data["spring_2025"]
-            if "registration" in spring:
-                for key, value in spring["registration"].items():
-                    text += f"{key.replace('_', ' ').title()}: {value}\n"
-            if "semester_dates" in spring:
-                text += "\nImportant Dates:\n"
-                for key, value in spring["semester_dates"].items():
-                    text += f"{key.replace('_', ' ').title()}: {value}\n"
-        
-        return text
+        parts = ["IMPORTANT ACADEMIC DEADLINES\n\n"]
+        
+        for key, heading in (("fall_2024", "FALL 2024 SEMESTER:\n"), ("spring_2025", "\nSPRING 2025 SEMESTER:\n")):
+            if key not in data:
+                continue
+            
+            parts.append(heading)
+            semester = data[key]
+            if "registration" in semester:
+                for name, value in semester["registration"].items():
+                    parts.append(f"{name.replace('_', ' ').title()}: {value}\n")
+            if "semester_dates" in semester:
+                parts.append("\nImportant Dates:\n")
+                for name, value in semester["semester_dates"].items():
+                    parts.append(f"{name.replace('_', ' ').title()}: {value}\n")
+        
+        return "".join(parts)
     
     def _process_advising_json(self, data: Dict) -> str:
         """Process advising_info.json into structured text"""
-        text = "ACADEMIC ADVISING INFORMATION\n\n"
+        parts = ["ACADEMIC ADVISING INFORMATION\n\n"]
         
         if "academic_advisors" in data:
             advisors = data["academic_advisors"]
@@ -251,115 +445,186 @@ class KnowledgeBaseIngestor:
                 fresh = advisors["freshmen_sophomores"]
                 if "primary_advisor" in fresh:
                     advisor = fresh["primary_advisor"]
-                    text += f"Freshman/Sophomore Advisor: {advisor.get('name', 'N/A')}\n"
-                    text += f"Office: {advisor.get('office', 'N/A')}\n"
-                    text += f"Email: {advisor.get('email', 'N/A')}\n"
-                    text += f"Phone: {advisor.get('phone', 'N/A')}\n\n"
+                    parts.append(
+                        f"Freshman/Sophomore Advisor: {advisor.get('name', 'N/A')}\n"
+                        f"Office: {advisor.get('office', 'N/A')}\n"
+                        f"Email: {advisor.get('email', 'N/A')}\n"
+                        f"Phone: {advisor.get('phone', 'N/A')}\n\n"
+                    )
         
         if "enrollment_pin_system" in data:
             pin_info = data["enrollment_pin_system"]
-            text += "ENROLLMENT PIN SYSTEM:\n"
-            text += f"Purpose: {pin_info.get('purpose', 'N/A')}\n"
+            parts.append("ENROLLMENT PIN SYSTEM:\n")
+            parts.append(f"Purpose: {pin_info.get('purpose', 'N/A')}\n")
             if "how_it_works" in pin_info:
-                text += "How it works:\n"
+                parts.append("How it works:\n")
                 for item in pin_info["how_it_works"]:
-                    text += f"- {item}\n"
+                    parts.append(f"- {item}\n")
         
-        return text
+        return "".join(parts)
     
     def _enhance_training_data(self, content: str) -> str:
         """Enhance the training_data.txt with additional context"""
-        enhanced = "MORGAN STATE UNIVERSITY COMPUTER SCIENCE DEPARTMENT\n"
-        enhanced += "COMPREHENSIVE KNOWLEDGE BASE\n"
-        enhanced += "=" * 60 + "\n\n"
-        enhanced += content
-        enhanced += "\n\n" + "=" * 60
-        enhanced += "\nLast Updated: " + datetime.utcnow().strftime("%Y-%m-%d")
-        return enhanced
+        return "".join((
+            "MORGAN STATE UNIVERSITY COMPUTER SCIENCE DEPARTMENT\n",
+            "COMPREHENSIVE KNOWLEDGE BASE\n",
+            "=" * 60 + "\n\n",
+            content,
+            "\n\n" + "=" * 60,
+            "\nLast Updated: " + datetime.utcnow().strftime("%Y-%m-%d")
+        ))
     
     def _json_to_text(self, data: Any, indent: int = 0) -> str:
         """Convert JSON data to readable text format"""
-        text = ""
-        indent_str = "  " * indent
+        parts = []
         
-        if isinstance(data, dict):
-            for key, value in data.items():
-                # Format key as readable text
-                formatted_key = key.replace('_', ' ').title()
-                
-                if isinstance(value, (dict, list)):
-                    text += f"\n{indent_str}{formatted_key}:\n"
-                    text += self._json_to_text(value, indent + 1)
-                else:
-                    text += f"{indent_str}{formatted_key}: {value}\n"
+        # Explicit stack of (node, indent); an indent of None marks text that
+        # is already rendered. Children are pushed in reverse to keep order.
+        stack = [(data, indent)]
+        while stack:
+            node, level = stack.pop()
+            if level is None:
+                parts.append(node)
+                continue
+            
+            indent_str = "  " * level
+            pending = []
+            
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    # Format key as readable text
+                    formatted_key = key.replace('_', ' ').title()
                     
-        elif isinstance(data, list):
-            for item in data:
-                if isinstance(item, (dict, list)):
-                    text += self._json_to_text(item, indent)
-                else:
-                    text += f"{indent_str}- {item}\n"
-        else:
-            text += f"{indent_str}{str(data)}\n"
+                    if isinstance(value, (dict, list)):
+                        pending.append((f"\n{indent_str}{formatted_key}:\n", None))
+                        pending.append((value, level + 1))
+                    else:
+                        pending.append((f"{indent_str}{formatted_key}: {value}\n", None))
+                        
+            elif isinstance(node, list):
+                for item in node:
+                    if isinstance(item, (dict, list)):
+                        pending.append((item, level))
+                    else:
+                        pending.append((f"{indent_str}- {item}\n", None))
+            else:
+                parts.append(f"{indent_str}{str(node)}\n")
+            
+            stack.extend(reversed(pending))
         
-        return text
+        return "".join(parts)
     
     def _categorize_file(self, filename: str) -> str:
         """Categorize file based on filename for better organization"""
-        categories = {
-            "advising": ["advising", "advisor"],
-            "courses": ["courses", "prerequisites", "programs"],
-            "registration": ["registration", "deadlines", "forms"],
-            "career": ["career", "internship", "organizations", "career_prep"],
-            "resources": ["tech", "tutoring", "locations", "tech_resources"],
-            "people": ["faculty", "staff", "contact", "faculty_staff", "contact_info"]
-        }
-        
-        filename_lower = filename.lower()
-        for category, keywords in categories.items():
-            for keyword in keywords:
-                if keyword in filename_lower:
-                    return category
-        
-        return "general"
+        return _category_for(filename.lower())
+    
+    def _relative_path(self, path: Path) -> str:
+        """Path of a knowledge base file relative to the knowledge base root"""
+        return path.relative_to(self.knowledge_base_dir).as_posix()
+    
+    def _generate_document_id(self, relative_path: str) -> str:
+        """Generate a stable document ID from a file's relative path"""
+        return hashlib.blake2b(relative_path.encode(), digest_size=8).hexdigest()
     
-    def _generate_document_id(self, content: str) -> str:
-        """Generate a unique document ID"""
-        return hashlib.md5(content.encode()).hexdigest()[:16]
+    @staticmethod
+    def _content_hash(content: str) -> str:
+        """Hash document content for change detection"""
+        return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+    
+    def _load_hash_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Load the relative path -> {"hash", "chunks"} cache from the last run"""
+        try:
+            with open(self.hash_cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            # Older caches stored the bare hash with no chunk count
+            return {
+                path: entry if isinstance(entry, dict) else {"hash": entry, "chunks": 0}
+                for path, entry in cache.items()
+            }
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable ingest cache {self.hash_cache_file}: {str(e)}")
+            return {}
+    
+    def _save_hash_cache(self):
+        """Atomically replace the ingest cache file"""
+        try:
+            self.processed_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.hash_cache_file.with_suffix(".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._hash_cache, f, indent=2, sort_keys=True)
+            os.replace(tmp_file, self.hash_cache_file)
+        except Exception as e:
+            logger.error(f"Failed to save ingest cache: {str(e)}")
     
     async def save_processing_log(self, result: Dict[str, Any]):
         """Save detailed processing log"""
         log_file = self.processed_dir / f"ingestion_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
         try:
-            with open(log_file, 'w') as f:
-                json.dump(result, f, indent=2, default=str)
+            # Keep the pretty-printed log small: spill long error lists to JSONL
+            errors = result.get("statistics", {}).get("errors", [])
+            if len(errors) > self.max_inline_errors:
+                errors_file = log_file.with_suffix(".errors.jsonl")
+                with open(errors_file, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(error) + "\n" for error in errors)
+                
+                result = {
+                    **result,
+                    "statistics": {
+                        **result["statistics"],
+                        "errors": {"count": len(errors), "file": str(errors_file)}
+                    }
+                }
+            
+            if orjson is not None:
+                with open(log_file, 'wb') as f:
+                    f.write(orjson.dumps(
+                        result,
+                        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                        default=str
+                    ))
+            else:
+                with open(log_file, 'w') as f:
+                    json.dump(result, f, indent=2, default=str)
             logger.info(f"Processing log saved to {log_file}")
         except Exception as e:
             logger.error(f"Failed to save processing log: {str(e)}")
     
     async def validate_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Validate documents before processing"""
-        valid_documents = []
-        
-        for doc in documents:
-            if not doc.get("content"):
-                logger.warning(f"Skipping document with empty content: {doc.get('metadata', {}).get('source')}")
-                continue
-            
-            if len(doc["content"]) < 10:
-                logger.warning(f"Skipping document with minimal content: {doc.get('metadata', {}).get('source')}")
-                continue
-            
-            valid_documents.append(doc)
-            self.stats["documents_created"] += 1
+        valid_documents = [doc for doc in documents if self._validate_document(doc)]
         
         logger.info(f"Validated {len(valid_documents)}/{len(documents)} documents")
         return valid_documents
     
+    def _validate_document(self, doc: Dict[str, Any]) -> bool:
+        """Check a single document has usable content, counting it if so"""
+        if not doc.get("content"):
+            logger.warning(f"Skipping document with empty content: {doc.get('metadata', {}).get('source')}")
+            return False
+        
+        if len(doc["content"]) < 10:
+            logger.warning(f"Skipping document with minimal content: {doc.get('metadata', {}).get('source')}")
+            return False
+        
+        self.stats["documents_created"] += 1
+        return True
+    
+    def _checkpoint_hashes(self, docs: List[Dict[str, Any]]):
+        """Record the content hashes of stored documents and save the cache"""
+        for doc in docs:
+            self._hash_cache[doc["metadata"]["path"]] = {
+                "hash": doc["metadata"]["content_hash"],
+                "chunks": doc["chunk_count"]
+            }
+        self._save_hash_cache()
+    
     async def ingest_all(self, clear_existing: bool = True):
         """Main ingestion process - ingest all knowledge base data"""
         start_time = datetime.now()
+        self.ingested_at = datetime.utcnow().isoformat()
         
         try:
             logger.info("=" * 60)
@@ -375,32 +640,62 @@ class KnowledgeBaseIngestor:
             if clear_existing:
                 logger.info("Clearing existing vectors from Pinecone...")
                 await self.pinecone_service.delete_vectors(delete_all=True)
+                
+                # Everything must be re-embedded now; persist the empty cache
+                # at once so a run that fails before its first checkpoint does
+                # not leave later runs skipping files missing from the index
+                self._hash_cache = {}
+                self._save_hash_cache()
+                
                 await asyncio.sleep(2)  # Wait for deletion to propagate
             
-            # Load all documents
-            logger.info("\nLoading knowledge base files...")
-            json_docs = await self.load_json_files()
-            text_docs = await self.load_text_files()
-            all_docs = json_docs + text_docs
+            # Stream documents as they load and send changed ones to LangChain,
+            # so embedding starts before every file is parsed
+            logger.info("\nLoading and processing knowledge base files...")
+            logger.info("This may take several minutes...")
             
-            logger.info(f"\nTotal files loaded: {len(all_docs)}")
+            categories = set()
+            valid_count = 0
             
-            # Validate documents
-            valid_docs = await self.validate_documents(all_docs)
+            async def changed_documents():
+                nonlocal valid_count
+                async for doc in self.iter_documents():
+                    valid_count += 1
+                    categories.add(doc["metadata"]["category"])
+                    
+                    content_hash = self._content_hash(doc["content"])
+                    doc["metadata"]["content_hash"] = content_hash
+                    cached = self._hash_cache.get(doc["metadata"]["path"], {})
+                    if cached.get("hash") == content_hash:
+                        self.stats["files_unchanged"] += 1
+                        continue
+                    
+                    # Lets process_documents delete chunks beyond the new count
+                    doc["previous_chunk_count"] = cached.get("chunks", 0)
+                    
+                    yield doc
+            
+            # Hashes are checkpointed after each stored batch, so an
+            # interrupted run resumes where it stopped
+            totals = await self.langchain_service.process_documents(
+                changed_documents(),
+                batch_size=self.process_batch_size,
+                on_batch_stored=self._checkpoint_hashes,
+                openai_service=self.openai_service
+            )
             
-            if not valid_docs:
+            logger.info(f"\nValid documents: {valid_count}")
+            
+            if not valid_count:
                 logger.error("No valid documents to process!")
                 return {"success": False, "error": "No valid documents"}
             
-            # Process documents through LangChain
-            logger.info("\nProcessing documents and generating embeddings...")
-            logger.info("This may take several minutes...")
-            
-            result = await self.langchain_service.process_documents(valid_docs)
+            if self.stats["files_unchanged"]:
+                logger.info(f"Skipped {self.stats['files_unchanged']} unchanged documents")
             
             # Update statistics
-            self.stats["chunks_generated"] = result.get("total_chunks", 0)
-            self.stats["vectors_stored"] = result.get("vectors_stored", 0)
+            self.stats["chunks_generated"] = totals["total_chunks"]
+            self.stats["vectors_stored"] = totals["vectors_stored"]
             
             # Get final Pinecone statistics
             final_stats = await self.pinecone_service.get_stats()
@@ -413,7 +708,7 @@ class KnowledgeBaseIngestor:
                 "duration_seconds": (datetime.now() - start_time).total_seconds(),
                 "statistics": self.stats,
                 "pinecone_stats": final_stats,
-                "categories_processed": list(set(doc["metadata"]["category"] for doc in valid_docs))
+                "categories_processed": list(categories)
             }
             
             # Save processing log
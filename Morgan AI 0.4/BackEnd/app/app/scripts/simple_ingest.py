@@ -10,6 +10,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from app.services.openai_service import OpenAIService
 from app.services.langchain_service import PineconeService as LangchainPineconeService
+from app.utils.text_processing import find_near_duplicates
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -64,19 +65,23 @@ async def ingest_training_data():
         
         logger.info(f"Split into {len(chunks)} chunks")
         
-        # Process each chunk
-        vectors_to_upsert = []
+        # Generate embeddings for all non-empty chunks in batched requests
+        indexed_chunks = [(i, chunk) for i, chunk in enumerate(chunks) if chunk.strip()]
         
-        for i, chunk in enumerate(chunks):
-            if not chunk.strip():
-                continue
-            
-            # Generate embedding
-            logger.info(f"Processing chunk {i+1}/{len(chunks)}...")
-            embedding = await openai_service.generate_embedding(chunk)
-            
-            # Create vector with metadata
-            vector = (
+        # Drop near-duplicate chunks (repeated bios, tables) before paying for embeddings
+        duplicates = find_near_duplicates([chunk for _, chunk in indexed_chunks])
+        if duplicates:
+            indexed_chunks = [item for n, item in enumerate(indexed_chunks) if n not in duplicates]
+            logger.info(f"Skipping {len(duplicates)} near-duplicate chunks")
+        
+        logger.info(f"Generating embeddings for {len(indexed_chunks)} chunks...")
+        embeddings = await openai_service.generate_embeddings_batch(
+            [chunk for _, chunk in indexed_chunks]
+        )
+        
+        # Create vectors with metadata
+        vectors_to_upsert = [
+            (
                 f"chunk_{i}",
                 embedding,
                 {
@@ -86,7 +91,8 @@ async def ingest_training_data():
                     "total_chunks": len(chunks)
                 }
             )
-            vectors_to_upsert.append(vector)
+            for (i, chunk), embedding in zip(indexed_chunks, embeddings)
+        ]
         
         logger.info(f"Generated {len(vectors_to_upsert)} vectors")
         
@@ -1,5 +1,5 @@
 from pinecone import Pinecone, ServerlessSpec
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, AsyncIterable, Callable, Iterable, List, Optional, Tuple, Union
 import logging
 import asyncio
 from app.core.config import settings
@@ -107,6 +107,107 @@ class PineconeService:
             logger.error(f"Pinecone upsert error: {str(e)}")
             raise PineconeException(f"Failed to upsert vectors: {str(e)}")
     
+    async def process_documents(
+        self,
+        documents: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        batch_size: int = 64,
+        on_batch_stored: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        openai_service: Optional[Any] = None
+    ) -> Dict[str, Any]:
+        """Chunk, embed and upsert documents, streaming them in batches
+        
+        Each document's chunk count is stored on it as "chunk_count". When a
+        document has "previous_chunk_count", vectors for chunks beyond its new
+        count are deleted before the batch is upserted.
+        
+        Args:
+            documents: Documents with "content" and "metadata" (including
+                "document_id"), as a list or an async iterator
+            batch_size: Chunks embedded and upserted together; each batch is
+                stored before more documents are pulled from the iterator
+            on_batch_stored: Called with the documents of each stored batch
+            openai_service: Service used for embeddings (defaults to the singleton)
+        """
+        # Imported here to avoid circular dependencies
+        from app.services.openai_service import get_openai_service
+        from app.utils.text_processing import TextProcessor, find_near_duplicates
+        
+        openai_service = openai_service or get_openai_service()
+        text_processor = TextProcessor()
+        totals = {"total_chunks": 0, "vectors_stored": 0, "duplicates_skipped": 0}
+        pending: List[Tuple[str, str, Dict[str, Any]]] = []
+        pending_docs: List[Dict[str, Any]] = []
+        stale_ids: List[str] = []
+        
+        async def flush():
+            # Drop near-duplicate chunks (repeated bios, tables) before paying
+            # for embeddings; their IDs are deleted so no older vector remains
+            duplicates = find_near_duplicates([text for _, text, _ in pending])
+            if duplicates:
+                stale_ids.extend(pending[index][0] for index in duplicates)
+                pending[:] = [item for index, item in enumerate(pending) if index not in duplicates]
+                totals["duplicates_skipped"] += len(duplicates)
+                logger.info(f"Skipping {len(duplicates)} near-duplicate chunks")
+            
+            embeddings = await openai_service.generate_embeddings_batch(
+                [text for _, text, _ in pending]
+            )
+            if stale_ids:
+                await self.delete_vectors(ids=list(stale_ids))
+            result = await self.upsert_vectors([
+                (vector_id, embedding, metadata)
+                for (vector_id, _, metadata), embedding in zip(pending, embeddings)
+            ])
+            totals["vectors_stored"] += result["upserted_count"]
+            
+            if on_batch_stored:
+                on_batch_stored(list(pending_docs))
+            pending.clear()
+            pending_docs.clear()
+            stale_ids.clear()
+        
+        async def add(doc: Dict[str, Any]):
+            metadata = doc["metadata"]
+            chunks = text_processor.chunk_text(
+                doc["content"],
+                chunk_size=settings.CHUNK_SIZE,
+                overlap=settings.CHUNK_OVERLAP
+            )
+            for i, chunk in enumerate(chunks):
+                pending.append((
+                    f"{metadata['document_id']}_{i}",
+                    chunk,
+                    {**metadata, "text": chunk, "chunk_index": i, "total_chunks": len(chunks)}
+                ))
+            stale_ids.extend(
+                f"{metadata['document_id']}_{i}"
+                for i in range(len(chunks), doc.get("previous_chunk_count", 0))
+            )
+            doc["chunk_count"] = len(chunks)
+            totals["total_chunks"] += len(chunks)
+            pending_docs.append(doc)
+            
+            # A document's chunks always go out in the same batch
+            if len(pending) >= batch_size:
+                await flush()
+        
+        try:
+            if isinstance(documents, AsyncIterable):
+                async for doc in documents:
+                    await add(doc)
+            else:
+                for doc in documents:
+                    await add(doc)
+            
+            if pending_docs:
+                await flush()
+            
+            return {**totals, "success": True}
+            
+        except Exception as e:
+            logger.error(f"Document processing error: {str(e)}")
+            raise PineconeException(f"Failed to process documents: {str(e)}")
+    
     async def query_vectors(
         self,
         query_embedding: List[float],
@@ -301,13 +402,13 @@ class PineconeService:
         """
         try:
             # Import OpenAI here to avoid circular dependency
-            from app.services.openai_service import OpenAIService
+            from app.services.openai_service import get_openai_service
             
             if not self.index:
                 await self.initialize()
             
             # Generate embedding for the query using OpenAI
-            openai_service = OpenAIService()
+            openai_service = get_openai_service()
             query_embedding = await openai_service.create_embedding(query)
             
             # Query Pinecone for similar vectors
@@ -1,28 +1,126 @@
 import os
+import io
 import json
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import weakref
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
+from datetime import datetime, timezone
+from functools import lru_cache
+import httpx
 import openai
 from openai import AsyncOpenAI
 import numpy as np
+import tiktoken
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.core.config import settings
 from app.services.thread_manager import ThreadManager
-from app.services.pinecone_service import PineconeService
+from app.services.pinecone_service import get_pinecone_service
+from app.utils.llm_cache import LLMCache
 
 logger = logging.getLogger(__name__)
 
+# Small-talk messages that never benefit from knowledge base retrieval
+_GREETINGS = frozenset({
+    "hi", "hello", "hey", "thanks", "thank you", "thx", "ok", "okay",
+    "bye", "goodbye", "yes", "no", "cool", "great", "good morning",
+    "good afternoon", "good evening"
+})
+_GREETING_WORDS = frozenset(word for phrase in _GREETINGS for word in phrase.split())
+
+_SENTIMENT_PROMPT = "Analyze the sentiment of the following text. Return a JSON with 'sentiment' (positive/negative/neutral) and 'score' (0-1)."
+_NEUTRAL_SENTIMENT = {"sentiment": "neutral", "score": 0.5}
+
+# Timeout for the embedding used by the semantic sentiment cache; the cache
+# is an optimization, so a slow embeddings API is skipped rather than waited on
+_SENTIMENT_EMBEDDING_TIMEOUT = 2.0
+
+# Input token cap for a single summarization request; older messages
+# beyond it are dropped
+_SUMMARY_INPUT_TOKEN_BUDGET = 12000
+
+# Running summaries kept in memory; least recently used sessions are evicted
+_SUMMARY_CACHE_SIZE = 1000
+
+# HTTP clients shared by every OpenAI call, one per event loop; a client's
+# pooled connections belong to the loop that opened them
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+# Read/write timeout for OpenAI requests, matching the SDK default; long
+# non-streamed completions, audio and batch calls send nothing until done
+_OPENAI_REQUEST_TIMEOUT = 600.0
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """Get the tiktoken encoding for a model, or None if it is unavailable"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        logger.warning(f"No tokenizer for model {model}, estimating token counts: {e}")
+        return None
+
+
+def _count_tokens(text: str, model: str) -> int:
+    """Count tokens in text, falling back to a chars/4 estimate"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def _truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Keep the first max_tokens tokens of text, falling back to chars/4"""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the HTTP/2 client for OpenAI requests on the running loop"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        # HTTP/2 multiplexes concurrent requests over one TLS connection
+        client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            # OPENAI_TIMEOUT only bounds connecting and waiting for a
+            # pooled connection
+            timeout=httpx.Timeout(
+                _OPENAI_REQUEST_TIMEOUT,
+                connect=settings.OPENAI_TIMEOUT,
+                pool=settings.OPENAI_TIMEOUT
+            )
+        )
+        _http_clients[loop] = client
+    return client
+
+
 class OpenAIService:
     """Service for handling OpenAI operations including Realtime API"""
     
     def __init__(self):
         """Initialize OpenAI service"""
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        # Created lazily per event loop, see the client property
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
         self.thread_manager = ThreadManager()
-        self.pinecone_service = PineconeService()
+        self.pinecone_service = get_pinecone_service()
+        self.llm_cache = LLMCache(
+            max_size=settings.LLM_CACHE_MAX_SIZE,
+            similarity_threshold=settings.LLM_CACHE_SIMILARITY_THRESHOLD,
+            default_ttl=settings.CACHE_TTL,
+            redis_url=settings.REDIS_URL
+        )
+        # Running conversation summaries: (session_id, max_length) ->
+        # (number of messages summarized, summary text)
+        self.summaries: "OrderedDict[Tuple[str, int], Tuple[int, str]]" = OrderedDict()
         
         # Model configurations
         self.chat_model = settings.OPENAI_MODEL
@@ -34,11 +132,29 @@ class OpenAIService:
         # Realtime API settings
         self.realtime_enabled = settings.OPENAI_REALTIME_ENABLED
         
-        # System prompt for Morgan AI
+        # System prompt for Morgan AI. The system message is built once and
+        # reused as the first message of every request so the prompt prefix
+        # stays byte-identical and can be served from OpenAI's prompt cache.
+        # Sampling parameters such as OPENAI_TEMPERATURE are not part of the
+        # prompt and do not affect caching.
         self.system_prompt = self._get_system_prompt()
+        self._system_message = {"role": "system", "content": self.system_prompt}
         
         logger.info("OpenAI service initialized")
     
+    @property
+    def client(self) -> AsyncOpenAI:
+        """OpenAI client bound to the running event loop's HTTP client"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed():
+            client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=get_http_client()
+            )
+            self._clients[loop] = client
+        return client
+    
     def _get_system_prompt(self) -> str:
         """Get the system prompt for the Morgan AI assistant"""
         return """You are the Morgan AI Assistant, a helpful and knowledgeable AI assistant for the 
@@ -65,14 +181,17 @@ class OpenAIService:
         use_rag: bool = True
     ) -> Dict[str, Any]:
         """Generate a chat response using GPT-4"""
-        import traceback
         try:
                 logger.info(f"[MorganAI] Starting chat response for session_id={session_id}, user_id={user_id}")
-                # Get conversation history
-                history = await self.thread_manager.get_messages(session_id, limit=10)
+                # Get recent conversation history, bounded by token budget
+                history = await self.thread_manager.get_messages(
+                    session_id,
+                    limit=settings.HISTORY_MESSAGE_LIMIT
+                )
+                history = self._fit_history_to_budget(history)
                 logger.info(f"[MorganAI] History type: {type(history)}, value: {history}")
                 # Build messages array
-                messages = [{"role": "system", "content": self.system_prompt}]
+                messages = [self._system_message]
                 if history:
                     for msg in history:
                         logger.info(f"[MorganAI] Processing history msg type: {type(msg)}, value: {msg}")
@@ -89,15 +208,16 @@ class OpenAIService:
                     try:
                         context = await self._get_rag_context(message)
                         logger.info(f"[MorganAI] RAG context: {context}")
-                        if context:
-                            messages.append({
-                                "role": "system",
-                                "content": f"Context from knowledge base:\n{context}"
-                            })
-                    except Exception as rag_err:
-                        logger.error(f"[MorganAI] Error getting RAG context: {rag_err}\n{traceback.format_exc()}")
-                # Add current message
-                messages.append({"role": "user", "content": message})
+                    except Exception:
+                        logger.exception("[MorganAI] Error getting RAG context: session=%s", session_id)
+                # Add current message. Retrieved context is prepended to the user
+                # turn rather than inserted as a system message so everything
+                # before it remains a cacheable prefix.
+                if context:
+                    user_content = f"Context from knowledge base:\n{context}\n\nQuestion: {message}"
+                else:
+                    user_content = message
+                messages.append({"role": "user", "content": user_content})
                 logger.info(f"[MorganAI] Messages for OpenAI: {messages}")
                 # Generate response
                 try:
@@ -110,86 +230,102 @@ class OpenAIService:
                     )
                     logger.info(f"[MorganAI] OpenAI response: {response}")
                     ai_response = response.choices[0].message.content
-                except Exception as openai_err:
-                    logger.error(f"[MorganAI] Error in OpenAI API call: {openai_err}\n{traceback.format_exc()}")
+                except Exception:
+                    logger.exception("[MorganAI] Error in OpenAI API call: session=%s", session_id)
                     raise
                 # Store in thread
+                now = datetime.now(timezone.utc)
                 try:
                     from app.models.chat import ChatMessage
                     user_msg = ChatMessage(
                         role="user",
                         content=message,
-                        timestamp=datetime.utcnow(),
+                        timestamp=now,
                         user_id=user_id
                     )
                     assistant_msg = ChatMessage(
                         role="assistant",
                         content=ai_response,
-                        timestamp=datetime.utcnow(),
+                        timestamp=now,
                         user_id=user_id
                     )
                     await self.thread_manager.add_message(session_id, user_msg)
                     await self.thread_manager.add_message(session_id, assistant_msg)
-                except Exception as thread_err:
-                    logger.error(f"[MorganAI] Error storing messages in thread: {thread_err}\n{traceback.format_exc()}")
+                except Exception:
+                    logger.exception("[MorganAI] Error storing messages in thread: session=%s", session_id)
                     raise
                 logger.info(f"[MorganAI] Chat response completed successfully.")
                 return {
                     "success": True,
                     "response": ai_response,
                     "session_id": session_id,
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": now.isoformat(),
                     "context_used": bool(context),
                     "model": self.chat_model
                 }
         except Exception as e:
-            logger.error(f"[MorganAI] Error generating chat response: {e}\n{traceback.format_exc()}")
+            logger.exception("[MorganAI] Error generating chat response: session=%s", session_id)
             return {
                 "success": False,
                 "error": str(e),
                 "response": "I apologize, but I encountered an error. Please try again."
             }
     
+    def _fit_history_to_budget(self, history: List[Any]) -> List[Any]:
+        """Keep the most recent messages that fit in HISTORY_TOKEN_BUDGET"""
+        budget = settings.HISTORY_TOKEN_BUDGET
+        used = 0
+        kept = []
+        for msg in reversed(history or []):
+            content = getattr(msg, "content", None) or ""
+            used += _count_tokens(content, self.chat_model)
+            if used > budget:
+                break
+            kept.append(msg)
+        kept.reverse()
+        return kept
+    
     async def _get_rag_context(self, query: str, top_k: int = 5) -> str:
         """Get relevant context from knowledge base using RAG"""
+        # Skip the embedding and Pinecone round trips for greetings/small talk
+        q = query.strip().lower().strip("!?.,")
+        if not q or q in _GREETINGS or all(word in _GREETING_WORDS for word in q.split()):
+            logger.info("[MorganAI RAG] Skipping retrieval for non-retrievable query")
+            return ""
+        
         try:
             # Generate embedding for query
             embedding = await self.generate_embedding(query)
             logger.info(f"[MorganAI RAG] Generated embedding of length {len(embedding)} for query: {query[:50]}...")
             
-            # Query Pinecone for similar documents (synchronous call)
-            results = self.pinecone_service.query_vectors(
-                query_embedding=embedding,
-                top_k=top_k
-            )
+            # Query Pinecone off the event loop; a stalled query falls back
+            # to answering without context
+            try:
+                results = await asyncio.wait_for(
+                    self.pinecone_service.aquery_vectors(
+                        query_embedding=embedding,
+                        top_k=top_k
+                    ),
+                    timeout=settings.PINECONE_QUERY_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"[MorganAI RAG] Pinecone query timed out after {settings.PINECONE_QUERY_TIMEOUT}s")
+                return ""
             logger.info(f"[MorganAI RAG] Query returned {len(results)} results")
             
-            # Format context
-            context_parts = []
-            for i, match in enumerate(results):
-                metadata = match.get("metadata") if isinstance(match, dict) else None
-                score = match.get("score", 0)
-                logger.info(f"[MorganAI RAG] Result {i+1}: score={score}, has_metadata={metadata is not None}")
-                
-                if metadata:
-                    text = metadata.get("text", "")
-                    source = metadata.get("source", "Unknown")
-                    logger.info(f"[MorganAI RAG] Result {i+1}: source={source}, text_len={len(text)}")
-                    
-                    # Lower threshold to 0.5 to see more results
-                    if score and score > 0.5:  
-                        context_parts.append(f"[Source: {source}]\n{text}")
-                        logger.info(f"[MorganAI RAG] Added result {i+1} to context (score {score} > 0.5)")
-                    else:
-                        logger.info(f"[MorganAI RAG] Skipped result {i+1} (score {score} <= 0.5)")
+            # Format context from matches above the 0.5 score threshold
+            context_parts = [
+                f"[Source: {m['metadata'].get('source', 'Unknown')}]\n{m['metadata'].get('text', '')}"
+                for m in results
+                if isinstance(m, dict) and m.get("metadata") and (m.get("score") or 0) > 0.5
+            ]
+            logger.info(f"[MorganAI RAG] Kept {len(context_parts)} of {len(results)} results (score > 0.5)")
             
             final_context = "\n\n".join(context_parts)
             logger.info(f"[MorganAI RAG] Final context length: {len(final_context)} chars, {len(context_parts)} sources")
             return final_context
-        except Exception as e:
-            logger.error(f"Error getting RAG context: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Error getting RAG context")
             return ""
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
@@ -207,6 +343,44 @@ class OpenAIService:
             logger.error(f"Error generating embedding: {e}")
             raise
     
+    async def generate_embeddings_batch(
+        self,
+        texts: List[str],
+        batch_size: int = 64,
+        max_concurrency: int = 4
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for many texts, sending batch_size inputs per request
+        
+        At most max_concurrency requests are in flight at once so large
+        ingests stay under the API rate limits.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch(batch)
+        
+        try:
+            batches = await asyncio.gather(*(
+                embed(texts[i:i + batch_size])
+                for i in range(0, len(texts), batch_size)
+            ))
+            return [embedding for batch in batches for embedding in batch]
+            
+        except Exception as e:
+            logger.error(f"Error generating embeddings batch: {e}")
+            raise
+    
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts in a single request, in input order"""
+        response = await self.client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
     async def create_embedding(self, text: str) -> List[float]:
         """Alias for generate_embedding - creates an embedding for the given text
         
@@ -339,7 +513,7 @@ class OpenAIService:
                 "audio": audio_response,
                 "audio_format": "mp3",
                 "session_id": session_id,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": response_data["timestamp"]
             }
             
         except Exception as e:
@@ -387,25 +561,128 @@ class OpenAIService:
     async def analyze_sentiment(self, text: str) -> Dict[str, Any]:
         """Analyze sentiment of user message"""
         try:
+            messages = [
+                {"role": "system", "content": _SENTIMENT_PROMPT},
+                {"role": "user", "content": text}
+            ]
+            
+            # Check exact cache, then semantic cache
+            cache_key = LLMCache.make_key(self.chat_model, messages, 0.3)
+            cached = await self.llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            # The lookup embedding is made without retries so an embeddings
+            # outage falls through to the LLM instead of stalling
+            embedding = None
+            try:
+                embedding_response = await self.client.with_options(
+                    max_retries=0,
+                    timeout=_SENTIMENT_EMBEDDING_TIMEOUT
+                ).embeddings.create(
+                    model=self.embedding_model,
+                    input=text
+                )
+                embedding = embedding_response.data[0].embedding
+                cached = self.llm_cache.get_similar("sentiment", embedding)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logger.warning(f"Skipping semantic sentiment cache: {e}")
+            
             response = await self.client.chat.completions.create(
                 model=self.chat_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Analyze the sentiment of the following text. Return a JSON with 'sentiment' (positive/negative/neutral) and 'score' (0-1)."
-                    },
-                    {"role": "user", "content": text}
-                ],
+                messages=messages,
                 max_tokens=100,
                 temperature=0.3
             )
             
             result = json.loads(response.choices[0].message.content)
+            
+            await self.llm_cache.set(cache_key, result)
+            if embedding is not None:
+                self.llm_cache.set_similar("sentiment", cache_key, embedding, result)
             return result
             
         except Exception as e:
             logger.error(f"Error analyzing sentiment: {e}")
-            return {"sentiment": "neutral", "score": 0.5}
+            return dict(_NEUTRAL_SENTIMENT)
+    
+    async def analyze_sentiment_batch(
+        self,
+        texts: List[str],
+        max_concurrency: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Analyze sentiment of many messages concurrently, in input order"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def analyze(text: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.analyze_sentiment(text)
+        
+        return await asyncio.gather(*(analyze(text) for text in texts))
+    
+    async def analyze_sentiment_offline(
+        self,
+        texts: List[str],
+        poll_interval: float = 30.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze sentiment for offline analytics using the OpenAI Batch API
+        
+        Batch jobs cost less than live requests but may take up to 24 hours,
+        so this is meant for background jobs, not request handlers.
+        """
+        lines = [
+            json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.chat_model,
+                    "messages": [
+                        {"role": "system", "content": _SENTIMENT_PROMPT},
+                        {"role": "user", "content": text}
+                    ],
+                    "max_tokens": 100,
+                    "temperature": 0.3
+                }
+            })
+            for i, text in enumerate(texts)
+        ]
+        batch_file = await self.client.files.create(
+            file=("sentiment_batch.jsonl", io.BytesIO("\n".join(lines).encode())),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"Submitted sentiment batch {batch.id} with {len(texts)} texts")
+        
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+        
+        results = [dict(_NEUTRAL_SENTIMENT) for _ in texts]
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.error(f"Sentiment batch {batch.id} ended with status {batch.status}")
+            return results
+        
+        # Map results back by custom_id
+        output = await self.client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                content = item["response"]["body"]["choices"][0]["message"]["content"]
+                results[int(item["custom_id"])] = json.loads(content)
+            except Exception as e:
+                logger.warning(f"Could not parse sentiment batch result: {e}")
+        
+        return results
     
     async def summarize_conversation(
         self,
@@ -414,34 +691,193 @@ class OpenAIService:
     ) -> str:
         """Generate a summary of the conversation"""
         try:
-            # Get conversation history
-            messages = await self.thread_manager.get_messages(session_id)
-            
-            if not messages:
-                return "No conversation to summarize."
-            
-            # Format conversation
-            conversation_text = "\n".join([
-                f"{msg['role']}: {msg['content']}"
-                for msg in messages
+            return "".join([
+                part async for part in self.stream_conversation_summary(session_id, max_length)
             ])
-            
-            # Generate summary
+        except Exception as e:
+            logger.error(f"Error summarizing conversation: {e}")
+            return "Error generating summary."
+    
+    async def stream_conversation_summary(
+        self,
+        session_id: str,
+        max_length: int = 500,
+        chunk_size: int = 20,
+        max_concurrency: int = 5
+    ) -> AsyncIterator[str]:
+        """
+        Stream a summary of the conversation as it is generated
+        
+        Long runs of new messages are split into windows of `chunk_size`
+        messages that are summarized in parallel (map), then the window
+        summaries are combined in a single streamed request (reduce).
+        """
+        # Get conversation history
+        messages = await self.thread_manager.get_messages(session_id)
+        
+        if not messages:
+            yield "No conversation to summarize."
+            return
+        
+        # Only summarize messages added since the last summary, and reuse
+        # the previous summary until enough new messages have arrived
+        summary_key = (session_id, max_length)
+        checkpoint, previous_summary = self.summaries.get(summary_key, (0, ""))
+        if summary_key in self.summaries:
+            self.summaries.move_to_end(summary_key)
+        if checkpoint > len(messages):
+            checkpoint, previous_summary = 0, ""
+        
+        new_messages = messages[checkpoint:]
+        if previous_summary and len(new_messages) < settings.SUMMARY_REFRESH_MESSAGES:
+            yield previous_summary
+            return
+        
+        # Map: summarize windows of the new messages in parallel
+        if len(new_messages) > chunk_size:
+            semaphore = asyncio.Semaphore(max_concurrency)
+            chunk_summaries = await asyncio.gather(*(
+                self._summarize_chunk(new_messages[i:i + chunk_size], semaphore)
+                for i in range(0, len(new_messages), chunk_size)
+            ))
+            conversation_text = "\n".join(
+                f"Part {i}: {chunk_summary}"
+                for i, chunk_summary in enumerate(chunk_summaries, 1)
+            )
+        else:
+            conversation_text = self._format_messages(new_messages, _SUMMARY_INPUT_TOKEN_BUDGET)
+        
+        if previous_summary:
+            conversation_text = (
+                f"Previous summary: {previous_summary}\n\n"
+                f"New messages:\n{conversation_text}\n\n"
+                "Produce an updated summary."
+            )
+        
+        summary_messages = [
+            {
+                "role": "system",
+                "content": f"Summarize the following conversation in {max_length} characters or less."
+            },
+            {"role": "user", "content": conversation_text}
+        ]
+        
+        cache_key = LLMCache.make_key(self.chat_model, summary_messages, 0.5)
+        cached = await self.llm_cache.get(cache_key)
+        if cached is not None:
+            self._remember_summary(summary_key, (len(messages), cached))
+            yield cached
+            return
+        
+        # Reduce: stream the final summary as it is generated
+        stream = await self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=summary_messages,
+            max_tokens=200,
+            temperature=0.5,
+            stream=True
+        )
+        
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        summary = "".join(parts)
+        await self.llm_cache.set(cache_key, summary)
+        self._remember_summary(summary_key, (len(messages), summary))
+    
+    def _remember_summary(self, key: Tuple[str, int], entry: Tuple[int, str]):
+        """Store a running summary, evicting the least recently used when full"""
+        if key in self.summaries:
+            self.summaries.move_to_end(key)
+        elif len(self.summaries) >= _SUMMARY_CACHE_SIZE:
+            self.summaries.popitem(last=False)
+        self.summaries[key] = entry
+    
+    async def _summarize_chunk(
+        self,
+        messages: List[Any],
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        """Summarize one window of messages for the map step"""
+        summary_messages = [
+            {
+                "role": "system",
+                "content": "Summarize this part of a conversation in a few sentences. Keep names, courses and decisions."
+            },
+            {"role": "user", "content": self._format_messages(messages, _SUMMARY_INPUT_TOKEN_BUDGET)}
+        ]
+        
+        cache_key = LLMCache.make_key(self.chat_model, summary_messages, 0.5)
+        cached = await self.llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        async with semaphore:
             response = await self.client.chat.completions.create(
                 model=self.chat_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"Summarize the following conversation in {max_length} characters or less."
-                    },
-                    {"role": "user", "content": conversation_text}
-                ],
-                max_tokens=200,
+                messages=summary_messages,
+                max_tokens=150,
                 temperature=0.5
             )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Error summarizing conversation: {e}")
-            return "Error generating summary."
\ No newline at end of file
+        
+        summary = response.choices[0].message.content
+        await self.llm_cache.set(cache_key, summary)
+        return summary
+    
+    def _format_messages(
+        self,
+        messages: List[Any],
+        token_budget: Optional[int] = None
+    ) -> str:
+        """
+        Format messages as 'role: content' lines
+        
+        With a token budget, the oldest messages that do not fit are dropped
+        so the request stays within the model's context. The newest message
+        is always kept, truncated if it alone exceeds the budget.
+        """
+        truncated = None
+        if token_budget is not None:
+            start = len(messages)
+            used = 0
+            while start > 0:
+                msg = messages[start - 1]
+                used += _count_tokens(msg.content, self.chat_model) + 4
+                if used > token_budget:
+                    break
+                start -= 1
+            
+            # Even the newest message alone is over budget; keep it truncated
+            # (it is then the only message) rather than sending nothing
+            if start == len(messages) and messages:
+                start -= 1
+                truncated = _truncate_tokens(messages[-1].content, max(token_budget - 4, 1), self.chat_model)
+            
+            messages = messages[start:]
+        
+        buf = io.StringIO()
+        write = buf.write
+        for msg in messages:
+            write(msg.role)
+            write(": ")
+            write(msg.content if truncated is None else truncated)
+            write("\n")
+        # Drop the final newline to match "\n".join
+        return buf.getvalue()[:-1]
+
+# Singleton instance
+_openai_service = None
+
+
+def get_openai_service() -> OpenAIService:
+    """Get or create OpenAIService singleton"""
+    global _openai_service
+    if _openai_service is None:
+        _openai_service = OpenAIService()
+    return _openai_service
@@ -1,11 +1,17 @@
 from typing import List, Dict, Any, Optional
 from pinecone import Pinecone, ServerlessSpec
+from tenacity import retry, stop_after_attempt, wait_fixed
+from itertools import islice
+import asyncio
 import logging
 from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Pinecone rejects delete requests with more than 1000 IDs
+DELETE_BATCH_SIZE = 1000
+
 
 class PineconeService:
     """Service for managing Pinecone vector database operations"""
@@ -20,7 +26,11 @@ class PineconeService:
             
             # Initialize or connect to index
             self._ensure_index_exists()
-            self.index = self.pc.Index(self.index_name)
+            # pool_threads keeps a reusable connection pool behind the index
+            self.index = self.pc.Index(
+                self.index_name,
+                pool_threads=settings.PINECONE_POOL_THREADS
+            )
             
             logger.info(f"✓ Pinecone initialized successfully with index: {self.index_name}")
         except Exception as e:
@@ -70,28 +80,32 @@ class PineconeService:
             Response from Pinecone upsert operation
         """
         try:
-            # Format vectors for Pinecone
-            formatted_vectors = [
-                {
-                    "id": vec_id,
-                    "values": embedding,
-                    "metadata": metadata
-                }
-                for vec_id, embedding, metadata in vectors
-            ]
-            
-            # Upsert in batches of 100
-            batch_size = 100
-            total_upserted = 0
+            # Format and send batches of 64 concurrently over the index's
+            # thread pool; each batch is formatted while earlier ones are in flight
+            batch_size = 64
+            pending = []
             
-            for i in range(0, len(formatted_vectors), batch_size):
-                batch = formatted_vectors[i:i + batch_size]
-                response = self.index.upsert(
+            for i in range(0, len(vectors), batch_size):
+                batch = [
+                    {
+                        "id": vec_id,
+                        "values": embedding,
+                        "metadata": metadata
+                    }
+                    for vec_id, embedding, metadata in vectors[i:i + batch_size]
+                ]
+                pending.append((len(batch), self.index.upsert(
                     vectors=batch,
-                    namespace=namespace
-                )
-                total_upserted += len(batch)
-                logger.info(f"Upserted batch {i//batch_size + 1}: {len(batch)} vectors")
+                    namespace=namespace,
+                    async_req=True
+                )))
+            
+            # Wait for all batches to complete
+            total_upserted = 0
+            for batch_num, (count, result) in enumerate(pending, 1):
+                result.get()
+                total_upserted += count
+                logger.info(f"Upserted batch {batch_num}: {count} vectors")
             
             logger.info(f"✓ Total vectors upserted: {total_upserted}")
             return {"upserted_count": total_upserted}
@@ -100,6 +114,7 @@ class PineconeService:
             logger.error(f"✗ Error upserting vectors: {str(e)}")
             raise
     
+    @retry(stop=stop_after_attempt(2), wait=wait_fixed(0.1), reraise=True)
     def query_vectors(
         self,
         query_embedding: List[float],
@@ -143,6 +158,61 @@ class PineconeService:
             logger.error(f"✗ Error querying vectors: {str(e)}")
             raise
     
+    async def aquery_vectors(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        namespace: str = "morgan-cs-dept",
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Async version of query_vectors that runs the query in a worker thread
+        so it does not block the event loop
+        """
+        return await asyncio.to_thread(
+            self.query_vectors,
+            query_embedding=query_embedding,
+            top_k=top_k,
+            namespace=namespace,
+            filter=filter
+        )
+    
+    async def aquery_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        namespace: str = "morgan-cs-dept",
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several queries concurrently
+        
+        Concurrency is limited by the default thread pool and by the index's
+        connection pool; raise PINECONE_POOL_THREADS when fanning out many
+        queries at once.
+        
+        Returns:
+            One result list per query embedding, in the same order
+        """
+        return await asyncio.gather(*[
+            self.aquery_vectors(
+                query_embedding=embedding,
+                top_k=top_k,
+                namespace=namespace,
+                filter=filter
+            )
+            for embedding in query_embeddings
+        ])
+    
+    def warm_up(self) -> None:
+        """
+        Issue a minimal query so DNS, TLS and index state are ready
+        before the first user request
+        """
+        probe = [1.0] + [0.0] * (self.dimension - 1)
+        self.index.query(vector=probe, top_k=1, namespace="morgan-cs-dept")
+        logger.info("✓ Pinecone connection warmed up")
+    
     def delete_vectors(
         self,
         ids: Optional[List[str]] = None,
@@ -166,8 +236,20 @@ class PineconeService:
                 logger.info(f"✓ Deleted all vectors from namespace: {namespace}")
                 return {"deleted": "all"}
             elif ids:
-                self.index.delete(ids=ids, namespace=namespace)
-                logger.info(f"✓ Deleted {len(ids)} vectors")
+                # Send 1000-ID batches concurrently over the index's thread pool
+                pending = []
+                id_iter = iter(ids)
+                while batch := list(islice(id_iter, DELETE_BATCH_SIZE)):
+                    pending.append(self.index.delete(
+                        ids=batch,
+                        namespace=namespace,
+                        async_req=True
+                    ))
+                
+                for result in pending:
+                    result.get()
+                
+                logger.info(f"✓ Deleted {len(ids)} vectors in {len(pending)} batches")
                 return {"deleted_count": len(ids)}
             else:
                 logger.warning("No vectors specified for deletion")
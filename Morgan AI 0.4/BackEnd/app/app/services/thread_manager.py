@@ -1,21 +1,175 @@
 from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import asyncio
+import os
 import uuid
 import json
 import logging
-from collections import defaultdict
+import aiosqlite
+from app.core.config import settings
 from app.models.chat import ChatMessage, ChatThread
 
 logger = logging.getLogger(__name__)
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT,
+    is_active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_threads_user_updated ON threads (user_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_threads_updated ON threads (updated_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    message_id TEXT,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts REAL NOT NULL,
+    user_id TEXT,
+    metadata TEXT,
+    UNIQUE (thread_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_thread_ts ON messages (thread_id, ts);
+"""
+
+# Trigram full-text index for substring search (SQLite 3.34+). It is keyed
+# by the explicit id column, which VACUUM never renumbers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+# Moves a messages table keyed by (thread_id, idx) aside so _SCHEMA can
+# create the id-keyed table; the old full-text index is dropped and rebuilt
+_MIGRATE_MESSAGES_PREPARE = """
+DROP TRIGGER IF EXISTS messages_fts_insert;
+DROP TRIGGER IF EXISTS messages_fts_delete;
+DROP TABLE IF EXISTS messages_fts;
+DROP INDEX IF EXISTS idx_messages_thread_ts;
+ALTER TABLE messages RENAME TO messages_old;
+"""
+
+_MIGRATE_MESSAGES_COPY = """
+INSERT INTO messages (thread_id, idx, message_id, role, content, ts, user_id, metadata)
+    SELECT thread_id, idx, message_id, role, content, ts, user_id, metadata
+    FROM messages_old ORDER BY thread_id, idx;
+DROP TABLE messages_old;
+"""
+
+_THREAD_COLUMNS = "thread_id, user_id, title, created_at, updated_at, message_count, metadata, is_active"
+_MESSAGE_COLUMNS = "message_id, role, content, ts, user_id, metadata"
+
 class ThreadManager:
     """Manage chat threads and message history"""
     
-    def __init__(self):
-        # In-memory storage (in production, use a database)
-        self.threads: Dict[str, ChatThread] = {}
-        self.messages: Dict[str, List[ChatMessage]] = defaultdict(list)
-        self.user_threads: Dict[str, List[str]] = defaultdict(list)
+    def __init__(self, db_path: Optional[str] = None):
+        # Threads and messages are persisted in SQLite (WAL mode); the
+        # connection is opened lazily on first use
+        self.db_path = db_path or settings.CHAT_DB_PATH
+        self._db: Optional[aiosqlite.Connection] = None
+        self._init_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._fts_enabled = False
+    
+    async def _get_db(self) -> aiosqlite.Connection:
+        """Open the database and create the schema on first use"""
+        if self._db is not None:
+            return self._db
+        
+        async with self._init_lock:
+            if self._db is None:
+                directory = os.path.dirname(self.db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                
+                db = await aiosqlite.connect(self.db_path)
+                db.row_factory = aiosqlite.Row
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute("PRAGMA synchronous=NORMAL")
+                
+                # Databases created before messages had an id column are
+                # rebuilt once
+                async with db.execute("PRAGMA table_info(messages)") as cursor:
+                    columns = {row["name"] for row in await cursor.fetchall()}
+                migrate = bool(columns) and "id" not in columns
+                if migrate:
+                    logger.info("Migrating messages table to an explicit id key")
+                    await db.executescript(_MIGRATE_MESSAGES_PREPARE)
+                
+                await db.executescript(_SCHEMA)
+                if migrate:
+                    await db.executescript(_MIGRATE_MESSAGES_COPY)
+                
+                try:
+                    await db.executescript(_FTS_SCHEMA)
+                    if migrate:
+                        await db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+                    self._fts_enabled = True
+                except Exception as e:
+                    logger.warning(f"FTS5 trigram search unavailable, using substring scan: {str(e)}")
+                await db.commit()
+                
+                self._db = db
+                logger.info(f"Thread database ready at {self.db_path}")
+        
+        return self._db
+    
+    async def close(self):
+        """Close the database connection"""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+    
+    @staticmethod
+    def _epoch(dt: datetime) -> float:
+        """Convert a datetime to epoch seconds, treating naive values as UTC"""
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    
+    @staticmethod
+    def _from_epoch(ts: float) -> datetime:
+        """Convert epoch seconds to a UTC datetime"""
+        return datetime.fromtimestamp(ts, tz=timezone.utc)
+    
+    def _row_to_thread(self, row: aiosqlite.Row) -> ChatThread:
+        """Build a ChatThread from a database row"""
+        return ChatThread(
+            thread_id=row["thread_id"],
+            user_id=row["user_id"],
+            title=row["title"],
+            created_at=self._from_epoch(row["created_at"]),
+            updated_at=self._from_epoch(row["updated_at"]),
+            message_count=row["message_count"],
+            metadata=json.loads(row["metadata"]) if row["metadata"] else {},
+            is_active=bool(row["is_active"])
+        )
+    
+    def _row_to_message(self, row: aiosqlite.Row) -> ChatMessage:
+        """Build a ChatMessage from a database row"""
+        return ChatMessage(
+            message_id=row["message_id"],
+            role=row["role"],
+            content=row["content"],
+            timestamp=self._from_epoch(row["ts"]),
+            user_id=row["user_id"],
+            metadata=json.loads(row["metadata"]) if row["metadata"] else {}
+        )
     
     async def create_thread(
         self,
@@ -28,20 +182,32 @@ class ThreadManager:
             if not thread_id:
                 thread_id = str(uuid.uuid4())
             
+            now = datetime.now(timezone.utc)
             thread = ChatThread(
                 thread_id=thread_id,
                 user_id=user_id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
+                created_at=now,
+                updated_at=now,
                 metadata=metadata or {}
             )
             
-            self.threads[thread_id] = thread
-            self.user_threads[user_id].append(thread_id)
+            db = await self._get_db()
+            async with self._write_lock:
+                await db.execute(
+                    f"INSERT INTO threads ({_THREAD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET user_id = excluded.user_id, "
+                    "updated_at = excluded.updated_at, metadata = excluded.metadata",
+                    (
+                        thread.thread_id, thread.user_id, thread.title,
+                        now.timestamp(), now.timestamp(), 0,
+                        json.dumps(thread.metadata), 1
+                    )
+                )
+                await db.commit()
             
             logger.info(f"Created thread {thread_id} for user {user_id}")
             return thread
-            
+        
         except Exception as e:
             logger.error(f"Error creating thread: {str(e)}")
             raise
@@ -51,7 +217,13 @@ class ThreadManager:
         thread_id: str
     ) -> Optional[ChatThread]:
         """Get a thread by ID"""
-        return self.threads.get(thread_id)
+        db = await self._get_db()
+        async with db.execute(
+            f"SELECT {_THREAD_COLUMNS} FROM threads WHERE thread_id = ?",
+            (thread_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return self._row_to_thread(row) if row else None
     
     async def get_user_threads(
         self,
@@ -61,19 +233,16 @@ class ThreadManager:
     ) -> List[ChatThread]:
         """Get all threads for a user"""
         try:
-            thread_ids = self.user_threads.get(user_id, [])
-            
-            # Sort by updated time (most recent first)
-            threads = []
-            for thread_id in thread_ids:
-                if thread_id in self.threads:
-                    threads.append(self.threads[thread_id])
-            
-            threads.sort(key=lambda x: x.updated_at, reverse=True)
-            
-            # Apply pagination
-            return threads[offset:offset + limit]
-            
+            # Most recent first, served from the (user_id, updated_at) index
+            db = await self._get_db()
+            async with db.execute(
+                f"SELECT {_THREAD_COLUMNS} FROM threads WHERE user_id = ? "
+                "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (user_id, limit, offset)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [self._row_to_thread(row) for row in rows]
+        
         except Exception as e:
             logger.error(f"Error getting user threads: {str(e)}")
             return []
@@ -85,34 +254,43 @@ class ThreadManager:
     ) -> ChatMessage:
         """Add a message to a thread"""
         try:
-            if thread_id not in self.threads:
-                raise ValueError(f"Thread {thread_id} not found")
-            
-            # Add message ID if not present
-            if not hasattr(message, 'message_id'):
-                message.message_id = str(uuid.uuid4())
-            
-            # Add timestamp if not present
-            if not hasattr(message, 'timestamp'):
-                message.timestamp = datetime.utcnow()
-            
-            self.messages[thread_id].append(message)
-            
-            # Update thread's last updated time
-            self.threads[thread_id].updated_at = datetime.utcnow()
-            self.threads[thread_id].message_count = len(self.messages[thread_id])
-            
-            # Update thread title if it's the first user message
-            if message.role == "user" and self.threads[thread_id].message_count == 1:
-                # Extract first few words as title
-                title = message.content[:50]
-                if len(message.content) > 50:
-                    title += "..."
-                self.threads[thread_id].title = title
+            db = await self._get_db()
+            async with self._write_lock:
+                async with db.execute(
+                    "SELECT message_count FROM threads WHERE thread_id = ?",
+                    (thread_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    raise ValueError(f"Thread {thread_id} not found")
+                
+                idx = row["message_count"]
+                await db.execute(
+                    f"INSERT INTO messages (thread_id, idx, {_MESSAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id, idx, message.message_id, message.role, message.content,
+                        self._epoch(message.timestamp), message.user_id,
+                        json.dumps(message.metadata or {})
+                    )
+                )
+                
+                # Update thread's last updated time, and its title if this
+                # is the first message and it is from the user
+                title = None
+                if message.role == "user" and idx == 0:
+                    title = message.content[:50]
+                    if len(message.content) > 50:
+                        title += "..."
+                await db.execute(
+                    "UPDATE threads SET updated_at = ?, message_count = ?, "
+                    "title = COALESCE(?, title) WHERE thread_id = ?",
+                    (datetime.now(timezone.utc).timestamp(), idx + 1, title, thread_id)
+                )
+                await db.commit()
             
             logger.debug(f"Added message to thread {thread_id}")
             return message
-            
+        
         except Exception as e:
             logger.error(f"Error adding message: {str(e)}")
             raise
@@ -126,23 +304,30 @@ class ThreadManager:
     ) -> List[ChatMessage]:
         """Get messages from a thread"""
         try:
-            if thread_id not in self.messages:
-                return []
-            
-            messages = self.messages[thread_id]
+            conditions = ["thread_id = ?"]
+            params: List[Any] = [thread_id]
             
             # Filter by time if specified
             if before:
-                messages = [m for m in messages if m.timestamp < before]
+                conditions.append("ts < ?")
+                params.append(self._epoch(before))
             if after:
-                messages = [m for m in messages if m.timestamp > after]
-            
-            # Apply limit
-            if limit:
-                messages = messages[-limit:]
-            
-            return messages
-            
+                conditions.append("ts > ?")
+                params.append(self._epoch(after))
+            
+            # Apply limit to the most recent messages (-1 means no limit)
+            params.append(limit or -1)
+            
+            db = await self._get_db()
+            async with db.execute(
+                f"SELECT {_MESSAGE_COLUMNS} FROM messages WHERE {' AND '.join(conditions)} "
+                "ORDER BY idx DESC LIMIT ?",
+                params
+            ) as cursor:
+                rows = await cursor.fetchall()
+            
+            return [self._row_to_message(row) for row in reversed(rows)]
+        
         except Exception as e:
             logger.error(f"Error getting messages: {str(e)}")
             return []
@@ -153,23 +338,15 @@ class ThreadManager:
     ):
         """Delete a thread and its messages"""
         try:
-            if thread_id in self.threads:
-                user_id = self.threads[thread_id].user_id
-                
-                # Remove from user's thread list
-                if user_id in self.user_threads:
-                    self.user_threads[user_id] = [
-                        tid for tid in self.user_threads[user_id] 
-                        if tid != thread_id
-                    ]
-                
-                # Delete thread and messages
-                del self.threads[thread_id]
-                if thread_id in self.messages:
-                    del self.messages[thread_id]
-                
+            db = await self._get_db()
+            async with self._write_lock:
+                await db.execute("DELETE FROM messages WHERE thread_id = ?", (thread_id,))
+                cursor = await db.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+                await db.commit()
+            
+            if cursor.rowcount:
                 logger.info(f"Deleted thread {thread_id}")
-                
+        
         except Exception as e:
             logger.error(f"Error deleting thread: {str(e)}")
             raise
@@ -182,36 +359,45 @@ class ThreadManager:
     ) -> List[Dict[str, Any]]:
         """Search through a user's chat history"""
         try:
-            results = []
+            db = await self._get_db()
             query_lower = query.lower()
             
-            # Get user's threads
-            thread_ids = self.user_threads.get(user_id, [])
-            
-            for thread_id in thread_ids:
-                if thread_id not in self.messages:
-                    continue
-                
-                # Search messages in thread
-                for message in self.messages[thread_id]:
-                    if query_lower in message.content.lower():
-                        results.append({
-                            "thread_id": thread_id,
-                            "message_id": getattr(message, 'message_id', ''),
-                            "content": message.content,
-                            "role": message.role,
-                            "timestamp": message.timestamp.isoformat() if message.timestamp else None,
-                            "thread_title": self.threads[thread_id].title if thread_id in self.threads else ""
-                        })
-                        
-                        if len(results) >= limit:
-                            break
-                
-                if len(results) >= limit:
-                    break
-            
-            return results
-            
+            # The trigram index needs at least 3 characters; shorter queries
+            # scan the user's messages
+            if self._fts_enabled and len(query_lower) >= 3:
+                sql = (
+                    "SELECT m.thread_id, m.message_id, m.content, m.role, m.ts, t.title "
+                    "FROM messages_fts f "
+                    "JOIN messages m ON m.id = f.rowid "
+                    "JOIN threads t ON t.thread_id = m.thread_id "
+                    "WHERE messages_fts MATCH ? AND t.user_id = ? "
+                    "ORDER BY t.updated_at DESC, m.idx LIMIT ?"
+                )
+                params = ('"' + query_lower.replace('"', '""') + '"', user_id, limit)
+            else:
+                sql = (
+                    "SELECT m.thread_id, m.message_id, m.content, m.role, m.ts, t.title "
+                    "FROM threads t JOIN messages m ON m.thread_id = t.thread_id "
+                    "WHERE t.user_id = ? AND instr(lower(m.content), ?) > 0 "
+                    "ORDER BY t.updated_at DESC, m.idx LIMIT ?"
+                )
+                params = (user_id, query_lower, limit)
+            
+            async with db.execute(sql, params) as cursor:
+                rows = await cursor.fetchall()
+            
+            return [
+                {
+                    "thread_id": row["thread_id"],
+                    "message_id": row["message_id"] or '',
+                    "content": row["content"],
+                    "role": row["role"],
+                    "timestamp": self._from_epoch(row["ts"]).isoformat(),
+                    "thread_title": row["title"] or ""
+                }
+                for row in rows
+            ]
+        
         except Exception as e:
             logger.error(f"Error searching chats: {str(e)}")
             return []
@@ -226,26 +412,35 @@ class ThreadManager:
     ):
         """Add feedback for a message"""
         try:
-            if thread_id not in self.messages:
+            if await self.get_thread(thread_id) is None:
                 raise ValueError(f"Thread {thread_id} not found")
             
-            # Find the message
-            for message in self.messages[thread_id]:
-                if getattr(message, 'message_id', '') == message_id:
-                    # Add feedback to message metadata
-                    if not hasattr(message, 'metadata'):
-                        message.metadata = {}
-                    
-                    message.metadata['feedback'] = {
-                        'rating': rating,
-                        'comment': feedback,
-                        'user_id': user_id,
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                    
-                    logger.info(f"Added feedback to message {message_id}")
-                    break
-                    
+            db = await self._get_db()
+            async with self._write_lock:
+                async with db.execute(
+                    "SELECT idx, metadata FROM messages WHERE thread_id = ? AND message_id = ?",
+                    (thread_id, message_id)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    return
+                
+                # Add feedback to message metadata
+                metadata = json.loads(row["metadata"]) if row["metadata"] else {}
+                metadata['feedback'] = {
+                    'rating': rating,
+                    'comment': feedback,
+                    'user_id': user_id,
+                    'timestamp': datetime.now(timezone.utc).isoformat()
+                }
+                await db.execute(
+                    "UPDATE messages SET metadata = ? WHERE thread_id = ? AND idx = ?",
+                    (json.dumps(metadata), thread_id, row["idx"])
+                )
+                await db.commit()
+            
+            logger.info(f"Added feedback to message {message_id}")
+        
         except Exception as e:
             logger.error(f"Error adding feedback: {str(e)}")
             raise
@@ -256,27 +451,34 @@ class ThreadManager:
     ) -> Dict[str, Any]:
         """Get a summary of a thread"""
         try:
-            if thread_id not in self.threads:
+            thread = await self.get_thread(thread_id)
+            if thread is None:
                 return {}
             
-            thread = self.threads[thread_id]
-            messages = self.messages.get(thread_id, [])
-            
             # Calculate statistics
-            user_messages = [m for m in messages if m.role == "user"]
-            assistant_messages = [m for m in messages if m.role == "assistant"]
+            db = await self._get_db()
+            async with db.execute(
+                "SELECT role, COUNT(*) AS n FROM messages WHERE thread_id = ? GROUP BY role",
+                (thread_id,)
+            ) as cursor:
+                counts = {row["role"]: row["n"] for row in await cursor.fetchall()}
+            async with db.execute(
+                "SELECT content FROM messages WHERE thread_id = ? ORDER BY idx DESC LIMIT 1",
+                (thread_id,)
+            ) as cursor:
+                last = await cursor.fetchone()
             
             return {
                 "thread_id": thread_id,
                 "title": thread.title,
                 "created_at": thread.created_at.isoformat() if thread.created_at else None,
                 "updated_at": thread.updated_at.isoformat() if thread.updated_at else None,
-                "message_count": len(messages),
-                "user_message_count": len(user_messages),
-                "assistant_message_count": len(assistant_messages),
-                "last_message": messages[-1].content[:100] if messages else None
+                "message_count": sum(counts.values()),
+                "user_message_count": counts.get("user", 0),
+                "assistant_message_count": counts.get("assistant", 0),
+                "last_message": last["content"][:100] if last else None
             }
-            
+        
         except Exception as e:
             logger.error(f"Error getting thread summary: {str(e)}")
             return {}
@@ -287,19 +489,21 @@ class ThreadManager:
     ):
         """Clean up threads older than specified days"""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-            threads_to_delete = []
-            
-            for thread_id, thread in self.threads.items():
-                if thread.updated_at < cutoff_date:
-                    threads_to_delete.append(thread_id)
-            
-            for thread_id in threads_to_delete:
-                await self.delete_thread(thread_id)
-            
-            logger.info(f"Cleaned up {len(threads_to_delete)} old threads")
-            return len(threads_to_delete)
-            
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=days_old)).timestamp()
+            
+            db = await self._get_db()
+            async with self._write_lock:
+                await db.execute(
+                    "DELETE FROM messages WHERE thread_id IN "
+                    "(SELECT thread_id FROM threads WHERE updated_at < ?)",
+                    (cutoff,)
+                )
+                cursor = await db.execute("DELETE FROM threads WHERE updated_at < ?", (cutoff,))
+                await db.commit()
+            
+            logger.info(f"Cleaned up {cursor.rowcount} old threads")
+            return cursor.rowcount
+        
         except Exception as e:
             logger.error(f"Error cleaning up threads: {str(e)}")
-            return 0
\ No newline at end of file
+            return 0
@@ -3,26 +3,51 @@ Functions for generating, processing, and manipulating text embeddings
 
 """
 
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
+from collections import OrderedDict
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import logging
 import hashlib
 import json
+import base64
+import struct
 from datetime import datetime
+import xxhash
 
 logger = logging.getLogger(__name__)
 
+# Marks embeddings compressed as float16 (int8 payloads are untagged)
+_FLOAT16_PREFIX = "f16:"
+
+# Fitted PCA projections keyed by (corpus hash, target_dim)
+_REDUCER_CACHE_SIZE = 8
+_reducer_cache: "OrderedDict[Tuple[str, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+# Below this many embeddings cluster_embeddings uses full-batch KMeans
+_KMEANS_BATCH_SIZE = 1024
+
+# Cache-miss sentinel, distinct from any stored value
+_MISSING = object()
+
 class EmbeddingUtils:
     """Utility functions for embedding operations"""
     
+    @staticmethod
+    def _normalize_np(v: np.ndarray) -> np.ndarray:
+        """Normalize an ndarray to unit length without leaving NumPy"""
+        norm = np.linalg.norm(v)
+        if norm == 0:
+            return v
+        return v / norm
+    
     @staticmethod
     def normalize_embedding(embedding: List[float]) -> List[float]:
         """Normalize an embedding vector to unit length"""
-        norm = np.linalg.norm(embedding)
-        if norm == 0:
+        v = np.asarray(embedding, dtype=np.float32)
+        if not v.any():
             return embedding
-        return (np.array(embedding) / norm).tolist()
+        return EmbeddingUtils._normalize_np(v).tolist()
     
     @staticmethod
     def calculate_similarity(embedding1: List[float], embedding2: List[float]) -> float:
@@ -47,16 +72,36 @@ class EmbeddingUtils:
     ) -> List[float]:
         """Calculate similarities for a batch of embeddings"""
         try:
-            query = np.array(query_embedding).reshape(1, -1)
-            batch = np.array(embeddings)
+            matrix = EmbeddingUtils.prepare_embedding_matrix(embeddings)
+            query = np.asarray(query_embedding, dtype=np.float32)
             
-            similarities = cosine_similarity(query, batch)[0]
+            similarities = EmbeddingUtils.batch_similarities_prepared(query, matrix)
             return similarities.tolist()
             
         except Exception as e:
             logger.error(f"Error in batch similarity calculation: {str(e)}")
             return []
     
+    @staticmethod
+    def prepare_embedding_matrix(embeddings: List[List[float]]) -> np.ndarray:
+        """Build an L2-normalized float32 matrix to reuse across similarity queries"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    @staticmethod
+    def batch_similarities_prepared(
+        query_vec: np.ndarray,
+        normalized_matrix: np.ndarray
+    ) -> np.ndarray:
+        """Calculate cosine similarities against a matrix from prepare_embedding_matrix"""
+        query_vec = np.asarray(query_vec, dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm == 0:
+            return np.zeros(normalized_matrix.shape[0], dtype=np.float32)
+        return normalized_matrix @ (query_vec / norm)
+    
     @staticmethod
     def average_embeddings(embeddings: List[List[float]]) -> List[float]:
         """Calculate the average of multiple embeddings"""
@@ -64,7 +109,7 @@ class EmbeddingUtils:
             return []
         
         try:
-            avg = np.mean(embeddings, axis=0)
+            avg = np.asarray(embeddings, dtype=np.float32).mean(axis=0)
             return avg.tolist()
             
         except Exception as e:
@@ -90,7 +135,7 @@ class EmbeddingUtils:
             weights = weights / weights.sum()
             
             # Calculate weighted average
-            weighted_avg = np.average(embeddings, axis=0, weights=weights)
+            weighted_avg = weights @ np.asarray(embeddings, dtype=np.float32)
             return weighted_avg.tolist()
             
         except Exception as e:
@@ -105,17 +150,29 @@ class EmbeddingUtils:
         threshold: float = 0.0
     ) -> List[Tuple[str, float]]:
         """Find most similar embeddings from a collection"""
-        results = []
-        
-        for id, embedding in embeddings:
-            similarity = EmbeddingUtils.calculate_similarity(query_embedding, embedding)
-            if similarity >= threshold:
-                results.append((id, similarity))
-        
-        # Sort by similarity (descending)
-        results.sort(key=lambda x: x[1], reverse=True)
+        if not embeddings or top_k <= 0:
+            return []
         
-        return results[:top_k]
+        try:
+            ids = [id for id, _ in embeddings]
+            matrix = EmbeddingUtils.prepare_embedding_matrix([e for _, e in embeddings])
+            
+            # Cosine similarity for all candidates in one matrix-vector product
+            scores = EmbeddingUtils.batch_similarities_prepared(query_embedding, matrix)
+            
+            # Select the top k without sorting the whole collection
+            k = min(top_k, len(scores))
+            if k < len(scores):
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            
+            return [(ids[i], float(scores[i])) for i in top if scores[i] >= threshold]
+            
+        except Exception as e:
+            logger.error(f"Error finding similar embeddings: {str(e)}")
+            return []
     
     @staticmethod
     def cluster_embeddings(
@@ -124,20 +181,31 @@ class EmbeddingUtils:
     ) -> Dict[int, List[int]]:
         """Simple clustering of embeddings using k-means"""
         try:
-            from sklearn.cluster import KMeans
+            from sklearn.cluster import KMeans, MiniBatchKMeans
             
             if len(embeddings) < n_clusters:
                 n_clusters = len(embeddings)
             
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-            labels = kmeans.fit_predict(embeddings)
+            # On unit-length vectors Euclidean distance ranks like cosine distance
+            matrix = EmbeddingUtils.prepare_embedding_matrix(embeddings)
+            
+            # Mini-batches only pay off on large inputs; on small ones they
+            # can leave clusters empty and return fewer than requested
+            if len(embeddings) < _KMEANS_BATCH_SIZE:
+                kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+            else:
+                kmeans = MiniBatchKMeans(
+                    n_clusters=n_clusters,
+                    random_state=42,
+                    batch_size=_KMEANS_BATCH_SIZE,
+                    n_init=3
+                )
+            labels = kmeans.fit_predict(matrix)
             
             # Group indices by cluster
             clusters = {}
-            for idx, label in enumerate(labels):
-                if label not in clusters:
-                    clusters[label] = []
-                clusters[label].append(idx)
+            for idx, label in enumerate(labels.tolist()):
+                clusters.setdefault(label, []).append(idx)
             
             return clusters
             
@@ -149,42 +217,75 @@ class EmbeddingUtils:
             return {0: list(range(len(embeddings)))}
     
     @staticmethod
-    def generate_embedding_id(text: str) -> str:
+    def generate_embedding_id(text: str, secure: bool = False) -> str:
         """Generate a unique ID for an embedding based on text content"""
-        return hashlib.md5(text.encode()).hexdigest()[:16]
+        data = text.encode('utf-8', 'surrogatepass')
+        
+        # SHA-256 for callers that need a cryptographic digest; hashlib's
+        # OpenSSL backend uses SHA extensions where the CPU has them
+        if secure:
+            return hashlib.sha256(data).hexdigest()
+        
+        # Non-cryptographic dedupe key; always xxh3 so the same text gets the
+        # same ID on every machine
+        return xxhash.xxh3_64_hexdigest(data)
     
     @staticmethod
     def validate_embedding(embedding: List[float], expected_dim: int = 1536) -> bool:
         """Validate an embedding vector"""
-        if not embedding:
+        if embedding is None or len(embedding) == 0:
             return False
         
         if len(embedding) != expected_dim:
             logger.warning(f"Embedding dimension mismatch: {len(embedding)} != {expected_dim}")
             return False
         
-        if not all(isinstance(x, (int, float)) for x in embedding):
+        try:
+            arr = np.asarray(embedding)
+        except (TypeError, ValueError):
+            arr = None
+        if arr is None or arr.shape != (expected_dim,) or arr.dtype.kind not in "iuf":
             logger.warning("Embedding contains non-numeric values")
             return False
         
-        if all(x == 0 for x in embedding):
+        if not np.isfinite(arr).all():
+            logger.warning("Embedding contains NaN or infinite values")
+            return False
+        
+        if not arr.any():
             logger.warning("Embedding is all zeros")
             return False
         
         return True
     
     @staticmethod
-    def compress_embedding(
-        embedding: List[float],
-        precision: int = 4
-    ) -> str:
-        """Compress embedding for storage"""
+    def quantize_embedding(embedding: List[float]) -> Tuple[np.ndarray, float]:
+        """Quantize an embedding to int8 with a per-vector scale"""
+        v = np.asarray(embedding, dtype=np.float32)
+        max_abs = float(np.abs(v).max()) if v.size else 0.0
+        scale = max_abs / 127 if max_abs else 1.0
+        return np.round(v / scale).astype(np.int8), scale
+    
+    @staticmethod
+    def compress_embedding(embedding: List[float], dtype: str = "float16") -> str:
+        """
+        Compress embedding for storage
+        
+        float16 (default) is stored as "f16:" + base64 of little-endian
+        float16[D]; int8 is stored as base64 of (float32 scale, int8[D]).
+        Any other dtype raises ValueError.
+        """
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported embedding dtype: {dtype!r} (expected 'float16' or 'int8')")
+        
         try:
-            # Round to specified precision
-            compressed = [round(x, precision) for x in embedding]
+            if dtype == "float16":
+                packed = np.asarray(embedding, dtype='<f2').tobytes()
+                return _FLOAT16_PREFIX + base64.b64encode(packed).decode('ascii')
             
-            # Convert to JSON string
-            return json.dumps(compressed)
+            quantized, scale = EmbeddingUtils.quantize_embedding(embedding)
+            packed = struct.pack('<f', scale) + quantized.tobytes()
+            return base64.b64encode(packed).decode('ascii')
             
         except Exception as e:
             logger.error(f"Error compressing embedding: {str(e)}")
@@ -194,11 +295,39 @@ class EmbeddingUtils:
     def decompress_embedding(compressed: str) -> List[float]:
         """Decompress stored embedding"""
         try:
-            return json.loads(compressed)
+            # Embeddings stored by older versions are plain JSON arrays
+            if compressed.lstrip().startswith('['):
+                return json.loads(compressed)
+            
+            if compressed.startswith(_FLOAT16_PREFIX):
+                raw = base64.b64decode(compressed[len(_FLOAT16_PREFIX):])
+                return np.frombuffer(raw, dtype='<f2').astype(np.float32).tolist()
+            
+            raw = base64.b64decode(compressed)
+            scale = struct.unpack_from('<f', raw)[0]
+            quantized = np.frombuffer(raw, dtype=np.int8, offset=4)
+            return (quantized.astype(np.float32) * scale).tolist()
         except Exception as e:
             logger.error(f"Error decompressing embedding: {str(e)}")
             return []
     
+    @staticmethod
+    def quantized_similarities(
+        query_embedding: List[float],
+        quantized_matrix: np.ndarray,
+        scales: np.ndarray
+    ) -> np.ndarray:
+        """
+        Dot-product scores against int8-quantized embeddings
+        
+        quantized_matrix is (N, D) int8 and scales is (N,) float32, as
+        produced by quantize_embedding. For unit-length embeddings (OpenAI's
+        are) this approximates cosine similarity.
+        """
+        query, query_scale = EmbeddingUtils.quantize_embedding(query_embedding)
+        dots = quantized_matrix.astype(np.int32) @ query.astype(np.int32)
+        return dots * (np.asarray(scales, dtype=np.float32) * query_scale)
+    
     @staticmethod
     def reduce_dimensionality(
         embeddings: List[List[float]],
@@ -206,17 +335,15 @@ class EmbeddingUtils:
     ) -> List[List[float]]:
         """Reduce embedding dimensionality using PCA"""
         try:
-            from sklearn.decomposition import PCA
-            
             if len(embeddings) < target_dim:
                 logger.warning(f"Not enough samples for PCA reduction to {target_dim}")
                 return embeddings
             
-            pca = PCA(n_components=target_dim)
-            reduced = pca.fit_transform(embeddings)
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            reducer = EmbeddingUtils.fit_reducer(matrix, target_dim)
+            reduced = EmbeddingUtils.apply_reducer(matrix, reducer)
             
-            logger.info(f"Reduced embeddings from {len(embeddings[0])} to {target_dim} dimensions")
-            logger.info(f"Explained variance ratio: {sum(pca.explained_variance_ratio_):.2f}")
+            logger.info(f"Reduced embeddings from {matrix.shape[1]} to {target_dim} dimensions")
             
             return reduced.tolist()
             
@@ -227,74 +354,109 @@ class EmbeddingUtils:
             logger.error(f"Dimensionality reduction error: {str(e)}")
             return embeddings
     
+    @staticmethod
+    def fit_reducer(
+        embeddings: List[List[float]],
+        target_dim: int = 256
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fit a PCA projection and return (W, offset) for apply_reducer
+        
+        W is the (D, target_dim) float32 projection and offset is mean @ W.
+        Fits are memoized per corpus, so refitting an unchanged corpus is free.
+        """
+        from sklearn.decomposition import PCA
+        
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        key = (hashlib.blake2b(matrix.tobytes(), digest_size=16).hexdigest(), target_dim)
+        cached = _reducer_cache.get(key)
+        if cached is not None:
+            _reducer_cache.move_to_end(key)
+            return cached
+        
+        pca = PCA(n_components=target_dim)
+        pca.fit(matrix)
+        logger.info(f"Explained variance ratio: {sum(pca.explained_variance_ratio_):.2f}")
+        
+        projection = pca.components_.T.astype(np.float32)
+        reducer = (projection, pca.mean_.astype(np.float32) @ projection)
+        
+        _reducer_cache[key] = reducer
+        if len(_reducer_cache) > _REDUCER_CACHE_SIZE:
+            _reducer_cache.popitem(last=False)
+        return reducer
+    
+    @staticmethod
+    def apply_reducer(
+        embeddings: List[List[float]],
+        reducer: Tuple[np.ndarray, np.ndarray]
+    ) -> np.ndarray:
+        """Project embeddings with a reducer from fit_reducer (one matrix product)"""
+        projection, offset = reducer
+        return np.asarray(embeddings, dtype=np.float32) @ projection - offset
+    
     @staticmethod
     def create_embedding_metadata(
         text: str,
-        embedding: List[float],
+        embedding: Union[np.ndarray, List[float]],
         source: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """Create metadata for an embedding"""
+        # No copy when the caller already holds a float32 ndarray
+        v = np.asarray(embedding, dtype=np.float32)
         return {
             "id": EmbeddingUtils.generate_embedding_id(text),
             "text_length": len(text),
-            "embedding_dim": len(embedding),
-            "embedding_norm": float(np.linalg.norm(embedding)),
+            "embedding_dim": v.shape[0],
+            "embedding_norm": float(np.sqrt(v @ v)),
             "source": source,
             "created_at": datetime.utcnow().isoformat(),
             **kwargs
         }
 
 class EmbeddingCache:
-    """Simple in-memory cache for embeddings"""
+    """Simple in-memory LRU cache for embeddings"""
     
     def __init__(self, max_size: int = 1000):
-        self.cache = {}
+        self.cache: "OrderedDict[str, List[float]]" = OrderedDict()
         self.max_size = max_size
-        self.access_count = {}
-        self.created_at = {}
+        # Running counters so stats() stays O(1)
+        self.hits = 0
+        self.misses = 0
     
     def get(self, key: str) -> Optional[List[float]]:
         """Get embedding from cache"""
-        if key in self.cache:
-            self.access_count[key] = self.access_count.get(key, 0) + 1
-            return self.cache[key]
-        return None
+        embedding = self.cache.get(key, _MISSING)
+        if embedding is _MISSING:
+            self.misses += 1
+            return None
+        
+        self.cache.move_to_end(key)
+        self.hits += 1
+        return embedding
     
     def set(self, key: str, embedding: List[float]):
-        """Store embedding in cache"""
-        # Check cache size
-        if len(self.cache) >= self.max_size:
-            self._evict_lru()
+        """Store embedding in cache, evicting the least recently used when full"""
+        if key in self.cache:
+            self.cache.move_to_end(key)
+        elif len(self.cache) >= self.max_size:
+            self.cache.popitem(last=False)
         
         self.cache[key] = embedding
-        self.access_count[key] = 0
-        self.created_at[key] = datetime.utcnow()
-    
-    def _evict_lru(self):
-        """Evict least recently used item"""
-        if not self.cache:
-            return
-        
-        # Find LRU item
-        lru_key = min(self.access_count.keys(), key=lambda k: self.access_count[k])
-        
-        # Remove from cache
-        del self.cache[lru_key]
-        del self.access_count[lru_key]
-        del self.created_at[lru_key]
     
     def clear(self):
         """Clear the cache"""
         self.cache.clear()
-        self.access_count.clear()
-        self.created_at.clear()
+        self.hits = 0
+        self.misses = 0
     
     def stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         return {
             "size": len(self.cache),
             "max_size": self.max_size,
-            "total_accesses": sum(self.access_count.values()),
-            "avg_accesses": np.mean(list(self.access_count.values())) if self.access_count else 0
+            "total_accesses": self.hits,
+            "avg_accesses": self.hits / len(self.cache) if self.cache else 0,
+            "hit_rate": self.hits / (self.hits + self.misses) if self.hits or self.misses else 0
         }
@@ -0,0 +1,204 @@
+"""
+Exact-match and semantic caching for LLM responses
+
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict, defaultdict
+import hashlib
+import json
+import logging
+import time
+import numpy as np
+
+from app.utils.embeddings import EmbeddingUtils
+
+logger = logging.getLogger(__name__)
+
+class _SemanticStore:
+    """
+    Normalized embeddings kept in one matrix that is updated in place
+
+    Rows are reused on eviction, so lookups score against the stored matrix
+    without rebuilding it. Expired rows are ignored by lookups and are the
+    first to be replaced.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.rows: Dict[str, int] = {}
+        self.keys: List[str] = []
+        self.values: List[Any] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.expires = np.empty(0)
+        self.last_used = np.empty(0, dtype=np.int64)
+        self._clock = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def put(self, key: str, vector: np.ndarray, expires_at: float, value: Any):
+        """Store a normalized vector, evicting an expired or least recently used row when full"""
+        row = self.rows.get(key)
+        if row is None:
+            size = len(self.keys)
+            if size < self.max_size:
+                self._reserve(size + 1, vector.shape[0])
+                row = size
+                self.keys.append(key)
+                self.values.append(None)
+            else:
+                expired = self.expires[:size] < time.monotonic()
+                row = int(np.argmin(np.where(expired, -1, self.last_used[:size])))
+                del self.rows[self.keys[row]]
+                self.keys[row] = key
+            self.rows[key] = row
+
+        self.matrix[row] = vector
+        self.expires[row] = expires_at
+        self.values[row] = value
+        self._touch(row)
+
+    def best_match(self, embedding: List[float], threshold: float) -> Optional[Any]:
+        """Get the value of the most similar unexpired row, if it reaches threshold"""
+        size = len(self.keys)
+        if not size:
+            return None
+
+        scores = EmbeddingUtils.batch_similarities_prepared(embedding, self.matrix[:size])
+        scores[self.expires[:size] < time.monotonic()] = -np.inf
+
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+
+        self._touch(best)
+        return self.values[best]
+
+    def _touch(self, row: int):
+        """Mark a row as most recently used"""
+        self._clock += 1
+        self.last_used[row] = self._clock
+
+    def _reserve(self, rows: int, dimension: int):
+        """Grow the backing arrays by doubling, up to max_size rows"""
+        capacity = 0 if self.matrix is None else self.matrix.shape[0]
+        if rows <= capacity:
+            return
+
+        new_capacity = min(self.max_size, max(rows, capacity * 2, 16))
+        matrix = np.empty((new_capacity, dimension), dtype=np.float32)
+        expires = np.zeros(new_capacity)
+        last_used = np.zeros(new_capacity, dtype=np.int64)
+        if capacity:
+            matrix[:capacity] = self.matrix
+            expires[:capacity] = self.expires
+            last_used[:capacity] = self.last_used
+        self.matrix, self.expires, self.last_used = matrix, expires, last_used
+
+class LLMCache:
+    """
+    Two-tier cache for LLM responses
+
+    The exact tier is keyed by a hash of (model, messages, temperature) and is
+    stored in Redis when a URL is configured, otherwise in memory. The
+    semantic tier keeps recent (embedding, response) pairs per namespace in
+    a prepared, normalized matrix and returns a cached response when a new embedding is at least
+    `similarity_threshold` cosine-similar to a stored one.
+
+    Cached values must be JSON-serializable.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        similarity_threshold: float = 0.92,
+        default_ttl: int = 3600,
+        redis_url: Optional[str] = None
+    ):
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.default_ttl = default_ttl
+        self.exact: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.semantic: Dict[str, _SemanticStore] = defaultdict(lambda: _SemanticStore(self.max_size))
+        self.redis = None
+
+        if redis_url:
+            try:
+                import redis.asyncio as aioredis
+                self.redis = aioredis.from_url(redis_url)
+            except ImportError:
+                logger.warning("redis not available, using in-memory LLM cache")
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], temperature: float) -> str:
+        """Build the exact-match key for a chat completion request"""
+        payload = json.dumps([model, messages, temperature], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a cached response by exact key"""
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(f"llm:{key}")
+                return json.loads(raw) if raw is not None else None
+            except Exception as e:
+                logger.warning(f"Redis cache read failed: {str(e)}")
+
+        entry = self.exact.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.exact[key]
+            return None
+
+        self.exact.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a response by exact key"""
+        ttl = ttl or self.default_ttl
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"llm:{key}", json.dumps(value), ex=ttl)
+                return
+            except Exception as e:
+                logger.warning(f"Redis cache write failed: {str(e)}")
+
+        self._put(self.exact, key, (time.monotonic() + ttl, value))
+
+    def get_similar(self, namespace: str, embedding: List[float]) -> Optional[Any]:
+        """Get the cached response whose embedding is most similar, if close enough"""
+        store = self.semantic.get(namespace)
+        if not store:
+            return None
+        return store.best_match(embedding, self.similarity_threshold)
+
+    def set_similar(
+        self,
+        namespace: str,
+        key: str,
+        embedding: List[float],
+        value: Any,
+        ttl: Optional[int] = None
+    ):
+        """Store a response under its embedding for similarity lookups"""
+        ttl = ttl or self.default_ttl
+        normalized = EmbeddingUtils.prepare_embedding_matrix([embedding])[0]
+        self.semantic[namespace].put(key, normalized, time.monotonic() + ttl, value)
+
+    def clear(self):
+        """Clear the in-memory tiers"""
+        self.exact.clear()
+        self.semantic.clear()
+
+    def _put(self, store: OrderedDict, key: str, entry: Tuple):
+        """Insert into an LRU store, evicting the oldest entry when full"""
+        if key in store:
+            store.move_to_end(key)
+        elif len(store) >= self.max_size:
+            store.popitem(last=False)
+        store[key] = entry
@@ -3,25 +3,145 @@ Functions for formatting and enhancing chat responses
 """
 
 
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 import re
 import json
 import logging
-from datetime import datetime
-from markdown import markdown
+from datetime import datetime, timedelta
+from functools import lru_cache
+from markdown import Markdown
 import html
+import threading
+import time
+
+try:
+    import bleach
+except ImportError:
+    bleach = None
 
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns shared by all formatters
+_EXCESS_WHITESPACE_RE = re.compile(r'\n{3,}| {2,}')
+_CODE_BLOCK_RE = re.compile(r'```(.*?)\n(.*?)```', re.DOTALL)
+_MARKDOWN_CHARS_RE = re.compile(r'[*_`#\[\]()]')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# Last formatted timestamp as (milliseconds since epoch, ISO string); one tuple
+# so concurrent readers never see a key paired with another key's string
+_EPOCH = datetime(1970, 1, 1)
+_last_timestamp = (0, "")
+
+def _utc_now_iso() -> str:
+    """Current naive UTC time in ISO format, reformatted at most once per millisecond"""
+    global _last_timestamp
+    millis = time.time_ns() // 1_000_000
+    cached_millis, cached_iso = _last_timestamp
+    if millis != cached_millis:
+        cached_iso = (_EPOCH + timedelta(milliseconds=millis)).isoformat(timespec='microseconds')
+        _last_timestamp = (millis, cached_iso)
+    return cached_iso
+
+# Tags and attributes kept by sanitize_html; classes carry codehilite styling
+_ALLOWED_TAGS = frozenset([
+    'p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'blockquote', 'code', 'pre', 'a', 'span', 'div'
+])
+_ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title'],
+    'code': ['class'],
+    'div': ['class'],
+    'span': ['class']
+}
+
+# Markdown instances are not thread-safe, so each thread builds its own once
+_markdown_local = threading.local()
+
+def _get_markdown() -> Markdown:
+    """Get this thread's Markdown converter, loading extensions on first use"""
+    converter = getattr(_markdown_local, 'converter', None)
+    if converter is None:
+        converter = _markdown_local.converter = Markdown(extensions=['extra', 'codehilite'])
+    return converter
+
+# Smart quotes and dashes normalized to ASCII by clean_text
+_CLEAN_TRANS = str.maketrans({
+    '\u201c': '"',
+    '\u201d': '"',
+    '\u2018': "'",
+    '\u2019': "'",
+    '\u2014': '-',
+    '\u2013': '-'
+})
+
+# Terms bolded by _add_emphasis and _format_inline
+_IMPORTANT_TERMS = (
+    'IMPORTANT', 'NOTE', 'WARNING', 'REQUIRED', 'DEADLINE',
+    'Prerequisites', 'Requirements', 'Steps'
+)
+_IMPORTANT_TERMS_FOLDED = tuple(term.casefold() for term in _IMPORTANT_TERMS)
+_EMPHASIS = {term.lower(): f"**{term}**" for term in _IMPORTANT_TERMS}
+
+# URLs not already in markdown, email addresses and important terms, matched
+# in one scan; only the term alternative is case-insensitive
+_INLINE_RE = re.compile(
+    r'(?P<url>(?<![\[\(])https?://[^\s\)]+(?![\]\)]))'
+    r'|(?P<email>[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
+    r'|(?P<term>(?i:\b(?:'
+    + '|'.join(sorted(map(re.escape, _IMPORTANT_TERMS), key=len, reverse=True))
+    + r')\b))'
+)
+
+# Replacement templates for highlight_text; other formats just normalize the term
+_HIGHLIGHT_TEMPLATES = {
+    "bold": "**{}**",
+    "italic": "*{}*",
+    "code": "`{}`"
+}
+
+@lru_cache(maxsize=256)
+def _term_pattern(terms: Tuple[str, ...], template: str) -> Tuple[Optional[re.Pattern], Dict[str, str]]:
+    """Compile one case-insensitive alternation over terms, with each term's replacement"""
+    replacements = {}
+    for term in terms:
+        if term:
+            replacements.setdefault(term.lower(), (term, template.format(term)))
+    
+    if not replacements:
+        return None, {}
+    
+    # Longest first so a term is not shadowed by one of its prefixes
+    alternatives = sorted((term for term, _ in replacements.values()), key=len, reverse=True)
+    pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, alternatives)) + r')\b', re.IGNORECASE)
+    return pattern, {key: replacement for key, (_, replacement) in replacements.items()}
+
+def _replace_terms(text: str, terms: Tuple[str, ...], template: str) -> str:
+    """Replace every whole-word occurrence of terms in a single pass"""
+    pattern, replacements = _term_pattern(terms, template)
+    if pattern is None:
+        return text
+    return pattern.sub(
+        lambda match: replacements.get(match.group(0).lower(), match.group(0)),
+        text
+    )
+
 class ResponseFormatter:
     """Format and enhance chatbot responses"""
     
+    # Shared constants; instances may still override them
+    max_response_length = 4000
+    max_cached_length = 8192
+    code_languages = frozenset([
+        "python", "javascript", "java", "cpp", "c", "html",
+        "css", "sql", "bash", "json", "yaml", "markdown"
+    ])
+    
     def __init__(self):
-        self.max_response_length = 4000
-        self.code_languages = [
-            "python", "javascript", "java", "cpp", "c", "html", 
-            "css", "sql", "bash", "json", "yaml", "markdown"
-        ]
+        # Formatting is deterministic, so repeated texts (retries, history
+        # re-renders) are served from per-instance LRU caches; texts longer
+        # than max_cached_length bypass them to bound memory
+        self._enhance_markdown_cached = lru_cache(maxsize=1024)(self._enhance_markdown)
+        self._render_html_cached = lru_cache(maxsize=1024)(self._render_html)
     
     def format_response(
         self,
@@ -55,7 +175,7 @@ class ResponseFormatter:
         response = {
             "content": formatted_content,
             "format": format_type,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _utc_now_iso(),
             "word_count": len(formatted_content.split()),
             "char_count": len(formatted_content)
         }
@@ -73,13 +193,13 @@ class ResponseFormatter:
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
         # Remove excessive whitespace
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        text = re.sub(r' {2,}', ' ', text)
+        text = _EXCESS_WHITESPACE_RE.sub(
+            lambda match: '\n\n' if match.group(0)[0] == '\n' else ' ',
+            text
+        )
         
         # Fix common encoding issues
-        text = text.replace('"', '"').replace('"', '"')
-        text = text.replace(''', "'").replace(''', "'")
-        text = text.replace('—', '-').replace('–', '-')
+        text = text.translate(_CLEAN_TRANS)
         
         # Trim whitespace
         text = text.strip()
@@ -88,54 +208,51 @@ class ResponseFormatter:
     
     def enhance_markdown(self, text: str) -> str:
         """Enhance markdown formatting"""
+        if len(text) > self.max_cached_length:
+            return self._enhance_markdown(text)
+        return self._enhance_markdown_cached(text)
+    
+    def _enhance_markdown(self, text: str) -> str:
+        """Run the markdown enhancement passes"""
+        # Each regex pass is skipped when a cheap substring check shows it
+        # cannot match, which is the common case for short prose answers
+        
         # Add proper headers
         text = self._format_headers(text)
         
-        # Format lists
-        text = self._format_lists(text)
-        
         # Format code blocks
-        text = self._format_code_blocks(text)
-        
-        # Add emphasis to important terms
-        text = self._add_emphasis(text)
+        if '```' in text:
+            text = self._format_code_blocks(text)
         
-        # Format links
-        text = self._format_links(text)
+        # Bold important terms and format links; the fused scan is only
+        # worth it when a link may be present, otherwise bold terms alone
+        if 'http' in text or '@' in text:
+            text = self._format_inline(text)
+        else:
+            folded = text.casefold()
+            if any(term in folded for term in _IMPORTANT_TERMS_FOLDED):
+                text = self._add_emphasis(text)
         
         return text
     
     def _format_headers(self, text: str) -> str:
         """Format headers properly"""
-        lines = text.split('\n')
-        formatted = []
-        
-        for line in lines:
-            # Convert uppercase lines to headers
-            if line.isupper() and len(line) > 3 and len(line) < 50:
-                formatted.append(f"## {line.title()}")
-            else:
-                formatted.append(line)
-        
-        return '\n'.join(formatted)
-    
-    def _format_lists(self, text: str) -> str:
-        """Format bullet points and numbered lists"""
-        # Convert dash lists to proper markdown
-        text = re.sub(r'^- ', '- ', text, flags=re.MULTILINE)
-        
-        # Convert numbered lists
-        text = re.sub(r'^(\d+)\. ', r'\1. ', text, flags=re.MULTILINE)
-        
-        return text
+        # Convert uppercase lines to headers; the cheap length test runs first
+        return '\n'.join([
+            f"## {line.title()}" if 3 < len(line) < 50 and line.isupper() else line
+            for line in text.split('\n')
+        ])
     
     def _format_code_blocks(self, text: str) -> str:
         """Format code blocks with language detection"""
-        # Find code blocks
-        code_pattern = r'```(.*?)\n(.*?)```'
-        
         def replace_code(match):
-            lang = match.group(1).strip().lower()
+            raw_lang = match.group(1)
+            lang = raw_lang.strip().lower()
+            
+            # Blocks already tagged in normalized form are left as they are
+            if lang and lang == raw_lang:
+                return match.group(0)
+            
             code = match.group(2)
             
             # Auto-detect language if not specified
@@ -144,7 +261,8 @@ class ResponseFormatter:
             
             return f"```{lang}\n{code}```"
         
-        text = re.sub(code_pattern, replace_code, text, flags=re.DOTALL)
+        # Find code blocks
+        text = _CODE_BLOCK_RE.sub(replace_code, text)
         
         return text
     
@@ -158,7 +276,8 @@ class ResponseFormatter:
             return 'java'
         elif '#include' in code:
             return 'cpp'
-        elif 'SELECT' in code.upper() or 'FROM' in code.upper():
+        # One uppercase copy serves both SQL keyword checks
+        elif 'SELECT' in (code_upper := code.upper()) or 'FROM' in code_upper:
             return 'sql'
         elif '<html' in code or '<div' in code:
             return 'html'
@@ -168,61 +287,58 @@ class ResponseFormatter:
     def _add_emphasis(self, text: str) -> str:
         """Add emphasis to important terms"""
         # Bold important keywords
-        important_terms = [
-            'IMPORTANT', 'NOTE', 'WARNING', 'REQUIRED', 'DEADLINE',
-            'Prerequisites', 'Requirements', 'Steps'
-        ]
-        
-        for term in important_terms:
-            text = re.sub(
-                f'\\b({term})\\b',
-                f'**{term}**',
-                text,
-                flags=re.IGNORECASE
-            )
-        
-        return text
+        return _replace_terms(text, _IMPORTANT_TERMS, "**{}**")
     
-    def _format_links(self, text: str) -> str:
-        """Format URLs as proper markdown links"""
-        # Format URLs that aren't already in markdown
-        url_pattern = r'(?<![\[\(])(https?://[^\s\)]+)(?![\]\)])'
-        text = re.sub(url_pattern, r'[\1](\1)', text)
-        
-        # Format email addresses
-        email_pattern = r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-        text = re.sub(email_pattern, r'[\1](mailto:\1)', text)
-        
-        return text
+    def _format_inline(self, text: str) -> str:
+        """Bold important terms and format URLs and emails as markdown links"""
+        def replace_inline(match):
+            value = match.group(0)
+            kind = match.lastgroup
+            if kind == 'url':
+                return f"[{value}]({value})"
+            if kind == 'email':
+                return f"[{value}](mailto:{value})"
+            return _EMPHASIS[value.lower()]
+        
+        return _INLINE_RE.sub(replace_inline, text)
     
     def markdown_to_html(self, text: str) -> str:
         """Convert markdown to HTML"""
         try:
-            html_content = markdown(text, extensions=['extra', 'codehilite'])
-            # Sanitize HTML
-            return self.sanitize_html(html_content)
+            if len(text) > self.max_cached_length:
+                return self._render_html(text)
+            return self._render_html_cached(text)
         except Exception as e:
             logger.error(f"Markdown conversion error: {str(e)}")
             return html.escape(text)
     
+    def _render_html(self, text: str) -> str:
+        """Render markdown to sanitized HTML"""
+        html_content = _get_markdown().reset().convert(text)
+        # Sanitize HTML
+        return self.sanitize_html(html_content)
+    
     def sanitize_html(self, html_content: str) -> str:
         """Sanitize HTML to prevent XSS"""
-        # Allow safe tags only
-        allowed_tags = [
-            'p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-            'ul', 'ol', 'li', 'blockquote', 'code', 'pre', 'a', 'span', 'div'
-        ]
+        if bleach is None:
+            logger.warning("bleach not available, returning unsanitized HTML")
+            return html_content
         
-        # This is a basic implementation
-        return html_content
+        # Allow safe tags only
+        return bleach.clean(
+            html_content,
+            tags=_ALLOWED_TAGS,
+            attributes=_ALLOWED_ATTRIBUTES,
+            strip=True
+        )
     
     def strip_formatting(self, text: str) -> str:
         """Remove all formatting and return plain text"""
         # Remove markdown formatting
-        text = re.sub(r'[*_`#\[\]()]', '', text)
+        text = _MARKDOWN_CHARS_RE.sub('', text)
         
         # Remove HTML tags if present
-        text = re.sub(r'<[^>]+>', '', text)
+        text = _HTML_TAG_RE.sub('', text)
         
         return text
     
@@ -232,11 +348,11 @@ class ResponseFormatter:
             return content
         
         # Add sources section
-        sources_section = "\n\n---\n### Sources\n"
-        for i, source in enumerate(sources, 1):
-            sources_section += f"{i}. {source}\n"
-        
-        return content + sources_section
+        return "".join((
+            content,
+            "\n\n---\n### Sources\n",
+            *(f"{i}. {source}\n" for i, source in enumerate(sources, 1))
+        ))
     
     def truncate_response(
         self,
@@ -249,18 +365,18 @@ class ResponseFormatter:
         if len(text) <= max_length:
             return text
         
-        # Try to truncate at sentence boundary
-        truncated = text[:max_length]
-        last_period = truncated.rfind('.')
-        last_newline = truncated.rfind('\n')
+        # Try to truncate at sentence boundary; bounded searches avoid
+        # copying the first max_length characters just to scan them
+        last_period = text.rfind('.', 0, max_length)
+        last_newline = text.rfind('\n', 0, max_length)
         
         # Choose the best truncation point
         if last_period > max_length - 200:
-            truncated = truncated[:last_period + 1]
+            truncated = text[:last_period + 1]
         elif last_newline > max_length - 200:
-            truncated = truncated[:last_newline]
+            truncated = text[:last_newline]
         else:
-            truncated = truncated[:max_length - 3] + '...'
+            truncated = text[:max_length - 3] + '...'
         
         # Add continuation notice
         truncated += "\n\n*[Response truncated due to length]*"
@@ -277,7 +393,7 @@ class ResponseFormatter:
         response = {
             "error": True,
             "message": error_message,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _utc_now_iso()
         }
         
         if error_code:
@@ -295,21 +411,21 @@ class ResponseFormatter:
         format_type: str = "bullet"
     ) -> str:
         """Format a list of items"""
-        formatted = ""
+        # Tables replace the whole output, title included
+        if format_type == "table":
+            return self._format_table(items)
+        
+        parts = []
         
         if title:
-            formatted += f"## {title}\n\n"
+            parts.append(f"## {title}\n\n")
         
         if format_type == "bullet":
-            for item in items:
-                formatted += f"- {item}\n"
+            parts.extend(f"- {item}\n" for item in items)
         elif format_type == "numbered":
-            for i, item in enumerate(items, 1):
-                formatted += f"{i}. {item}\n"
-        elif format_type == "table":
-            formatted = self._format_table(items)
+            parts.extend(f"{i}. {item}\n" for i, item in enumerate(items, 1))
         
-        return formatted
+        return "".join(parts)
     
     def _format_table(self, items: List[Dict[str, Any]]) -> str:
         """Format items as a markdown table"""
@@ -317,17 +433,18 @@ class ResponseFormatter:
             return ""
         
         # Get headers from first item
-        headers = list(items[0].keys())
+        headers = tuple(items[0].keys())
         
-        # Build table
-        table = "| " + " | ".join(headers) + " |\n"
-        table += "| " + " | ".join(["-" * len(h) for h in headers]) + " |\n"
+        # Build table rows in a list and join once
+        rows = [
+            "| " + " | ".join(headers) + " |\n",
+            "| " + " | ".join(["-" * len(h) for h in headers]) + " |\n"
+        ]
         
         for item in items:
-            row = "| " + " | ".join([str(item.get(h, "")) for h in headers]) + " |\n"
-            table += row
+            rows.append("| " + " | ".join([str(item.get(h, "")) for h in headers]) + " |\n")
         
-        return table
+        return "".join(rows)
     
     def format_code_snippet(
         self,
@@ -355,24 +472,48 @@ class ResponseFormatter:
         highlight_format: str = "bold"
     ) -> str:
         """Highlight specific terms in text"""
-        for term in terms:
-            if highlight_format == "bold":
-                replacement = f"**{term}**"
-            elif highlight_format == "italic":
-                replacement = f"*{term}*"
-            elif highlight_format == "code":
-                replacement = f"`{term}`"
-            else:
-                replacement = term
-            
-            text = re.sub(
-                f'\\b{re.escape(term)}\\b',
-                replacement,
-                text,
-                flags=re.IGNORECASE
-            )
+        template = _HIGHLIGHT_TEMPLATES.get(highlight_format, "{}")
+        return _replace_terms(text, tuple(terms), template)
+
+class StreamingFormatter:
+    """Format streamed response text one completed paragraph at a time"""
+    
+    def __init__(self, formatter: Optional[ResponseFormatter] = None):
+        self.formatter = formatter or ResponseFormatter()
+        self._buffer: List[str] = []
+    
+    def feed(self, chunk: str) -> str:
+        """Add a streamed chunk; return formatted text for any paragraphs it completed"""
+        self._buffer.append(chunk)
         
-        return text
+        # Paragraphs only end at a blank line, so chunks without a newline
+        # cannot complete one
+        if '\n' not in chunk:
+            return ""
+        
+        text = "".join(self._buffer)
+        boundary = text.rfind('\n\n')
+        
+        # Hold everything while inside an unterminated code block
+        if boundary == -1 or text.count('```', 0, boundary) % 2:
+            self._buffer = [text]
+            return ""
+        
+        rest = text[boundary + 2:]
+        self._buffer = [rest] if rest else []
+        
+        formatted = self._format(text[:boundary])
+        return formatted + "\n\n" if formatted else ""
+    
+    def flush(self) -> str:
+        """Format and return whatever is still buffered at the end of the stream"""
+        text = "".join(self._buffer)
+        self._buffer = []
+        return self._format(text)
+    
+    def _format(self, text: str) -> str:
+        """Run the clean and markdown passes over a finished segment"""
+        return self.formatter.enhance_markdown(self.formatter.clean_text(text))
 
 class ConversationFormatter:
     """Format conversation threads and messages"""
@@ -388,7 +529,7 @@ class ConversationFormatter:
         message = {
             "role": role,
             "content": content,
-            "timestamp": timestamp.isoformat() if timestamp else datetime.utcnow().isoformat()
+            "timestamp": timestamp.isoformat() if timestamp else _utc_now_iso()
         }
         
         if metadata:
@@ -419,11 +560,13 @@ class ConversationFormatter:
             return "Empty conversation"
         
         # Get first user message
-        for msg in messages:
-            if msg.get("role") == "user":
-                summary = msg.get("content", "")[:max_length]
-                if len(msg.get("content", "")) > max_length:
-                    summary += "..."
-                return summary
-        
-        return "Conversation"
\ No newline at end of file
+        content = next(
+            (msg.get("content", "") for msg in messages if msg.get("role") == "user"),
+            None
+        )
+        if content is None:
+            return "Conversation"
+        
+        if len(content) > max_length:
+            return content[:max_length] + "..."
+        return content
\ No newline at end of file
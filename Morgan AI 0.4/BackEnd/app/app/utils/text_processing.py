@@ -3,35 +3,142 @@ import re
 import string
 import unicodedata
 import logging
-from collections import Counter
+import zlib
+from collections import Counter, deque
+from functools import cached_property, lru_cache
+import numpy as np
 import nltk
 from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+from nltk.stem import WordNetLemmatizer, SnowballStemmer
 
 logger = logging.getLogger(__name__)
 
-# Download required NLTK data
-try:
-    nltk.data.find('punkt')
-except LookupError:
-    nltk.download('punkt')
-try:
-    nltk.data.find('stopwords')
-except LookupError:
-    nltk.download('stopwords')
-try:
-    nltk.data.find('wordnet')
-except LookupError:
-    nltk.download('wordnet')
+# NLTK data is located (and downloaded if missing) on first use
+_NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet'
+}
+
+@lru_cache(maxsize=None)
+def _ensure_nltk(resource: str) -> None:
+    """Download an NLTK resource if it is not installed"""
+    try:
+        nltk.data.find(_NLTK_RESOURCES[resource])
+    except LookupError:
+        nltk.download(resource)
+
+# Precompiled patterns shared by all processors
+_WHITESPACE_RE = re.compile(r'\s+')
+_SPECIAL_CHARS_RE = re.compile(r'[^\w\s\.\,\!\?\-\(\)]')
+_MULTI_SPACE_RE = re.compile(r' +')
+_MULTI_NEWLINE_RE = re.compile(r'\n{3,}')
+_QUESTION_WORD_RE = re.compile(r'^(What|When|Where|Who|Why|How|Is|Are|Can|Could|Should|Would|Will)')
+
+# Groups are non-capturing so findall returns the full match
+_ENTITY_PATTERNS = {
+    # Course codes (e.g., COSC 111)
+    'courses': re.compile(r'\b(?:COSC|MATH|PHYS|CHEM)\s+\d{3}\b'),
+    # Professor names (Dr./Prof. LastName)
+    'professors': re.compile(r'\b(?:Dr\.|Prof\.)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?'),
+    # Room numbers
+    'rooms': re.compile(r'\b(?:Room|Suite|Office)\s+\d+[A-Z]?\b'),
+    # Dates (various formats)
+    'dates': re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b'),
+    # Times
+    'times': re.compile(r'\b\d{1,2}:\d{2}\s*(?:AM|PM|am|pm)?\b'),
+    # Emails
+    'emails': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    # Phone numbers
+    'phones': re.compile(r'\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}')
+}
+
+# MinHash permutations: (a * h + b) mod a Mersenne prime, truncated to 32 bits
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_WORD_RE = re.compile(r'\w+')
+
+@lru_cache(maxsize=4)
+def _minhash_permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fixed-seed permutation coefficients so signatures are stable across runs"""
+    rng = np.random.RandomState(1)
+    a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash_signature(text: str, num_perm: int = 126, shingle_size: int = 5) -> Optional[np.ndarray]:
+    """MinHash signature over word shingles, or None for text without words"""
+    words = _SHINGLE_WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    
+    shingles = {
+        ' '.join(words[i:i + shingle_size])
+        for i in range(max(len(words) - shingle_size + 1, 1))
+    }
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    
+    a, b = _minhash_permutations(num_perm)
+    permuted = ((hashes[:, None] * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0)
+
+def find_near_duplicates(
+    texts: List[str],
+    threshold: float = 0.85,
+    bands: int = 18,
+    rows: int = 7,
+    shingle_size: int = 5
+) -> Dict[int, int]:
+    """
+    Find near-duplicate texts with MinHash-LSH
+    
+    Returns a mapping of duplicate index -> index of the earlier text it
+    duplicates. Texts sharing any LSH band are compared by estimated
+    Jaccard similarity of their word shingles.
+    """
+    num_perm = bands * rows
+    buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+    signatures: Dict[int, np.ndarray] = {}
+    duplicates: Dict[int, int] = {}
+    
+    for index, text in enumerate(texts):
+        signature = minhash_signature(text, num_perm, shingle_size)
+        if signature is None:
+            continue
+        
+        keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+        
+        original = next(
+            (
+                candidate
+                for band, key in enumerate(keys)
+                for candidate in buckets[band].get(key, ())
+                if np.mean(signatures[candidate] == signature) >= threshold
+            ),
+            None
+        )
+        if original is not None:
+            duplicates[index] = original
+            continue
+        
+        # Only originals are indexed, so duplicates always map to the first copy
+        signatures[index] = signature
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(index)
+    
+    return duplicates
 
 class TextProcessor:
     """Main text processing utility class"""
     
-    def __init__(self, language: str = 'english'):
+    def __init__(self, language: str = 'english', fast: bool = False):
         self.language = language
-        self.stop_words = set(stopwords.words(language))
-        self.lemmatizer = WordNetLemmatizer()
+        self.fast = fast
         
         # Common abbreviations in academic context
         self.abbreviations = {
@@ -44,14 +151,45 @@ class TextProcessor:
             'MSU': 'Morgan State University',
             'COSC': 'Computer Science Course'
         }
+        
+        # One alternation over all abbreviations, longest first
+        abbr_keys = sorted(self.abbreviations, key=len, reverse=True)
+        self._abbr_re = re.compile(r'\b(?:' + '|'.join(map(re.escape, abbr_keys)) + r')\b')
+        # Character class of abbreviation first letters, to skip text
+        # that cannot contain any abbreviation
+        first_chars = sorted({abbr[0] for abbr in abbr_keys})
+        self._abbr_first_re = re.compile('[' + ''.join(map(re.escape, first_chars)) + ']')
+        
+        # Fast word tokenizer: alphanumeric runs, keeping inner ' and -
+        self._word_re = re.compile(r"\w+(?:['-]\w+)*")
+    
+    @cached_property
+    def stop_words(self) -> frozenset:
+        """Stopwords for the processor's language, loaded on first use"""
+        _ensure_nltk('stopwords')
+        return frozenset(stopwords.words(self.language))
+    
+    @cached_property
+    def lemmatizer(self) -> WordNetLemmatizer:
+        """WordNet lemmatizer, created on first use"""
+        _ensure_nltk('wordnet')
+        return WordNetLemmatizer()
+    
+    @cached_property
+    def _normalize_token(self):
+        """Memoized per-token lemmatizer, or Snowball stemmer when fast=True"""
+        # Stemming is for bulk ingest where exact lemmas don't matter;
+        # vocabularies repeat heavily, so results are cached per token
+        normalize = SnowballStemmer(self.language).stem if self.fast else self.lemmatizer.lemmatize
+        return lru_cache(maxsize=50000)(normalize)
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         
         # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s\.\,\!\?\-\(\)]', '', text)
+        text = _SPECIAL_CHARS_RE.sub('', text)
         
         # Normalize unicode characters
         text = unicodedata.normalize('NFKD', text)
@@ -64,6 +202,7 @@ class TextProcessor:
     def tokenize_sentences(self, text: str) -> List[str]:
         """Tokenize text into sentences"""
         try:
+            _ensure_nltk('punkt')
             sentences = sent_tokenize(text)
             return [s.strip() for s in sentences if s.strip()]
         except Exception as e:
@@ -71,9 +210,13 @@ class TextProcessor:
             # Fallback to simple splitting
             return text.split('. ')
     
-    def tokenize_words(self, text: str) -> List[str]:
-        """Tokenize text into words"""
+    def tokenize_words(self, text: str, precise: bool = False) -> List[str]:
+        """Tokenize text into lowercase words (precise=True uses NLTK's Treebank tokenizer)"""
+        if not precise:
+            return self._word_re.findall(text.lower())
+        
         try:
+            _ensure_nltk('punkt')
             return word_tokenize(text.lower())
         except Exception as e:
             logger.error(f"Word tokenization error: {str(e)}")
@@ -82,24 +225,25 @@ class TextProcessor:
     
     def remove_stopwords(self, tokens: List[str]) -> List[str]:
         """Remove stopwords from token list"""
-        return [token for token in tokens if token not in self.stop_words]
+        stop_words = self.stop_words
+        return [token for token in tokens if token not in stop_words]
     
     def lemmatize_tokens(self, tokens: List[str]) -> List[str]:
-        """Lemmatize tokens"""
+        """Lemmatize tokens (or stem them when created with fast=True)"""
         try:
-            return [self.lemmatizer.lemmatize(token) for token in tokens]
+            normalize = self._normalize_token
+            return [normalize(token) for token in tokens]
         except Exception as e:
             logger.error(f"Lemmatization error: {str(e)}")
             return tokens
     
     def expand_abbreviations(self, text: str) -> str:
         """Expand known abbreviations"""
-        for abbr, full in self.abbreviations.items():
-            # Use word boundaries to avoid partial matches
-            pattern = r'\b' + re.escape(abbr) + r'\b'
-            text = re.sub(pattern, full, text)
+        if not self._abbr_first_re.search(text):
+            return text
         
-        return text
+        # Single pass; word boundaries avoid partial matches
+        return self._abbr_re.sub(lambda m: self.abbreviations[m.group(0)], text)
     
     def extract_keywords(
         self,
@@ -113,11 +257,8 @@ class TextProcessor:
         tokens = self.remove_stopwords(tokens)
         tokens = self.lemmatize_tokens(tokens)
         
-        # Filter by length
-        tokens = [t for t in tokens if len(t) >= min_length]
-        
-        # Count frequencies
-        counter = Counter(tokens)
+        # Filter by length and count frequencies
+        counter = Counter(t for t in tokens if len(t) >= min_length)
         
         # Return top keywords
         return counter.most_common(max_keywords)
@@ -125,8 +266,8 @@ class TextProcessor:
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """Calculate Jaccard similarity between two texts"""
         # Tokenize and clean
-        tokens1 = set(self.tokenize_words(text1.lower()))
-        tokens2 = set(self.tokenize_words(text2.lower()))
+        tokens1 = frozenset(self.tokenize_words(text1))
+        tokens2 = frozenset(self.tokenize_words(text2))
         
         # Calculate Jaccard similarity
         if not tokens1 and not tokens2:
@@ -134,10 +275,9 @@ class TextProcessor:
         if not tokens1 or not tokens2:
             return 0.0
         
-        intersection = tokens1.intersection(tokens2)
-        union = tokens1.union(tokens2)
-        
-        return len(intersection) / len(union)
+        # |A ∪ B| = |A| + |B| - |A ∩ B|, without building the union
+        intersection = len(tokens1 & tokens2)
+        return intersection / (len(tokens1) + len(tokens2) - intersection)
     
     def chunk_text(
         self,
@@ -150,20 +290,20 @@ class TextProcessor:
         chunks = []
         
         if method == 'character':
-            # Character-based chunking
+            # Character-based chunking; scan offsets in the original text
+            # and slice once per chunk
+            text_length = len(text)
             start = 0
-            while start < len(text):
+            while start < text_length:
                 end = start + chunk_size
-                chunk = text[start:end]
                 
-                # Try to break at sentence boundary
-                if end < len(text):
-                    last_period = chunk.rfind('. ')
-                    if last_period > chunk_size - 200:
-                        end = start + last_period + 2
-                        chunk = text[start:end]
+                # Try to break at sentence boundary in the last 200 characters
+                if end < text_length:
+                    last_period = text.rfind('. ', max(start, end - 199), end)
+                    if last_period != -1:
+                        end = last_period + 2
                 
-                chunks.append(chunk)
+                chunks.append(text[start:end])
                 start = end - overlap
                 
         elif method == 'sentence':
@@ -179,14 +319,14 @@ class TextProcessor:
                     chunks.append(' '.join(current_chunk))
                     # Keep some overlap
                     if overlap > 0:
-                        keep_sentences = []
+                        keep_sentences = deque()
                         kept_size = 0
                         for s in reversed(current_chunk):
                             kept_size += len(s)
                             if kept_size >= overlap:
                                 break
-                            keep_sentences.insert(0, s)
-                        current_chunk = keep_sentences
+                            keep_sentences.appendleft(s)
+                        current_chunk = list(keep_sentences)
                         current_size = kept_size
                     else:
                         current_chunk = []
@@ -202,49 +342,11 @@ class TextProcessor:
     
     def extract_entities(self, text: str) -> Dict[str, List[str]]:
         """Extract named entities from text"""
-        entities = {
-            'courses': [],
-            'professors': [],
-            'rooms': [],
-            'dates': [],
-            'times': [],
-            'emails': [],
-            'phones': []
+        # Remove duplicates, keeping first-seen order
+        return {
+            key: list(dict.fromkeys(pattern.findall(text)))
+            for key, pattern in _ENTITY_PATTERNS.items()
         }
-        
-        # Extract course codes (e.g., COSC 111)
-        course_pattern = r'\b(COSC|MATH|PHYS|CHEM)\s+\d{3}\b'
-        entities['courses'] = re.findall(course_pattern, text)
-        
-        # Extract professor names (Dr./Prof. LastName)
-        prof_pattern = r'\b(Dr\.|Prof\.)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?'
-        entities['professors'] = re.findall(prof_pattern, text)
-        
-        # Extract room numbers
-        room_pattern = r'\b(Room|Suite|Office)\s+\d+[A-Z]?\b'
-        entities['rooms'] = re.findall(room_pattern, text)
-        
-        # Extract dates (various formats)
-        date_pattern = r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b'
-        entities['dates'] = re.findall(date_pattern, text)
-        
-        # Extract times
-        time_pattern = r'\b\d{1,2}:\d{2}\s*(AM|PM|am|pm)?\b'
-        entities['times'] = re.findall(time_pattern, text)
-        
-        # Extract emails
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        entities['emails'] = re.findall(email_pattern, text)
-        
-        # Extract phone numbers
-        phone_pattern = r'\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'
-        entities['phones'] = re.findall(phone_pattern, text)
-        
-        # Remove duplicates
-        for key in entities:
-            entities[key] = list(set(entities[key]))
-        
-        return entities
     
     def summarize_text(
         self,
@@ -259,20 +361,18 @@ class TextProcessor:
             return text
         
         if method == 'frequency':
-            # Frequency-based summarization
+            # Frequency-based summarization; tokenize each sentence once
+            sentence_tokens = [
+                self.remove_stopwords(self.tokenize_words(sentence))
+                for sentence in sentences
+            ]
             word_freq = Counter()
-            
-            for sentence in sentences:
-                tokens = self.tokenize_words(sentence.lower())
-                tokens = self.remove_stopwords(tokens)
+            for tokens in sentence_tokens:
                 word_freq.update(tokens)
             
             # Score sentences
             sentence_scores = {}
-            for sentence in sentences:
-                tokens = self.tokenize_words(sentence.lower())
-                tokens = self.remove_stopwords(tokens)
-                
+            for sentence, tokens in zip(sentences, sentence_tokens):
                 if tokens:
                     score = sum(word_freq[token] for token in tokens)
                     sentence_scores[sentence] = score / len(tokens)
@@ -285,9 +385,10 @@ class TextProcessor:
             )[:max_sentences]
             
             # Return in original order
+            top_set = {sentence for sentence, _ in top_sentences}
             summary_sentences = []
             for sentence in sentences:
-                if any(sentence == s[0] for s in top_sentences):
+                if sentence in top_set:
                     summary_sentences.append(sentence)
                     if len(summary_sentences) >= max_sentences:
                         break
@@ -302,33 +403,36 @@ class TextProcessor:
         """Get various statistics about the text"""
         sentences = self.tokenize_sentences(text)
         words = self.tokenize_words(text)
+        word_count = len(words)
+        unique_words = len(set(words))
         
-        # Calculate readability (simple version)
-        avg_word_length = sum(len(word) for word in words) / len(words) if words else 0
-        avg_sentence_length = len(words) / len(sentences) if sentences else 0
+        # Calculate readability (simple version); one C-level join gives
+        # the total character count of all words
+        avg_word_length = len(''.join(words)) / word_count if word_count else 0
+        avg_sentence_length = word_count / len(sentences) if sentences else 0
         
         # Flesch Reading Ease approximation
         flesch_score = 206.835 - 1.015 * avg_sentence_length - 84.6 * (avg_word_length / 4.7)
         
         return {
             'character_count': len(text),
-            'word_count': len(words),
+            'word_count': word_count,
             'sentence_count': len(sentences),
             'paragraph_count': text.count('\n\n') + 1,
             'average_word_length': round(avg_word_length, 2),
             'average_sentence_length': round(avg_sentence_length, 2),
-            'unique_words': len(set(words)),
-            'lexical_diversity': len(set(words)) / len(words) if words else 0,
+            'unique_words': unique_words,
+            'lexical_diversity': unique_words / word_count if word_count else 0,
             'flesch_reading_ease': round(flesch_score, 2)
         }
     
     def normalize_whitespace(self, text: str) -> str:
         """Normalize whitespace in text"""
         # Replace multiple spaces with single space
-        text = re.sub(r' +', ' ', text)
+        text = _MULTI_SPACE_RE.sub(' ', text)
         
         # Replace multiple newlines with double newline
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        text = _MULTI_NEWLINE_RE.sub('\n\n', text)
         
         # Remove trailing whitespace from lines
         lines = text.split('\n')
@@ -347,7 +451,7 @@ class TextProcessor:
             if sentence.strip().endswith('?'):
                 questions.append(sentence.strip())
             # Check for question words at start
-            elif re.match(r'^(What|When|Where|Who|Why|How|Is|Are|Can|Could|Should|Would|Will)', sentence):
+            elif _QUESTION_WORD_RE.match(sentence):
                 questions.append(sentence.strip())
         
         return questions
@@ -362,6 +466,11 @@ class CourseTextProcessor(TextProcessor):
         self.course_code_pattern = re.compile(r'[A-Z]{2,4}\s*\d{3}[A-Z]?')
         self.gpa_pattern = re.compile(r'\d\.\d{1,2}')
         self.credit_pattern = re.compile(r'\d+\s*credits?')
+        # First course code after any prerequisite keyword on the same line
+        self.prereq_pattern = re.compile(
+            r'(?:prerequisite|prereq|required|must have completed).*?(' + self.course_code_pattern.pattern + ')',
+            re.IGNORECASE
+        )
     
     def extract_course_codes(self, text: str) -> List[str]:
         """Extract course codes from text"""
@@ -371,17 +480,8 @@ class CourseTextProcessor(TextProcessor):
     
     def extract_prerequisites(self, text: str) -> List[str]:
         """Extract prerequisite courses from text"""
-        prereq_keywords = ['prerequisite', 'prereq', 'required', 'must have completed']
-        
-        prerequisites = []
-        for keyword in prereq_keywords:
-            if keyword in text.lower():
-                # Find course codes near the keyword
-                pattern = f'{keyword}.*?({self.course_code_pattern.pattern})'
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                prerequisites.extend(matches)
-        
-        return list(set(prerequisites))
+        # One scan for all keywords; dedupe keeping first-seen order
+        return list(dict.fromkeys(self.prereq_pattern.findall(text)))
     
     def extract_gpa(self, text: str) -> List[str]:
         """Extract GPA values from text"""
@@ -2,9 +2,16 @@
 Simple script to ingest knowledge base into Pinecone
 """
 import asyncio
+import hashlib
 import json
 from pathlib import Path
 import sys
+import tiktoken
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -12,6 +19,47 @@ sys.path.append(str(Path(__file__).parent.parent))
 from app.services.openai_service import OpenAIService
 from app.services.pinecone_service import get_pinecone_service
 
+# Embedding inputs per request, and tokens per input (the embedding models
+# accept 8191; a little headroom is kept)
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_TOKENS = 8000
+
+def split_for_embedding(text: str, model: str):
+    """Split text into pieces that fit the embedding model's input limit"""
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    
+    tokens = encoding.encode(text)
+    if len(tokens) <= EMBED_MAX_TOKENS:
+        return [text]
+    return [
+        encoding.decode(tokens[i:i + EMBED_MAX_TOKENS])
+        for i in range(0, len(tokens), EMBED_MAX_TOKENS)
+    ]
+
+async def embed_pending(openai_service, pending):
+    """Embed (vector_id, text, metadata) items in batches; None marks a failed item"""
+    embeddings = []
+    for start in range(0, len(pending), EMBED_BATCH_SIZE):
+        batch = pending[start:start + EMBED_BATCH_SIZE]
+        try:
+            embeddings.extend(await openai_service.generate_embeddings_batch(
+                [text for _, text, _ in batch]
+            ))
+        except Exception as e:
+            # One bad input fails the whole request; retry the batch item by
+            # item so only that input is lost
+            print(f"  ✗ Batch failed ({e}), embedding its items one at a time")
+            for vector_id, text, _ in batch:
+                try:
+                    embeddings.append(await openai_service.generate_embedding(text))
+                except Exception as e:
+                    print(f"  ✗ Error embedding {vector_id}: {e}")
+                    embeddings.append(None)
+    return embeddings
+
 async def main():
     print("=== Morgan AI Knowledge Base Simple Ingestion ===\n")
     
@@ -25,6 +73,8 @@ async def main():
     
     print(f"Found {len(all_files)} files to process\n")
     
+    # (vector_id, text, metadata) per file piece, embedded together below
+    pending = []
     vectors_to_upsert = []
     
     for file_path in all_files:
@@ -35,8 +85,11 @@ async def main():
             if file_path.suffix == '.json':
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                # Convert JSON to text
-                content = json.dumps(data, indent=2)
+                # Convert JSON to compact text; indentation only adds tokens
+                if orjson is not None:
+                    content = orjson.dumps(data).decode('utf-8')
+                else:
+                    content = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
             else:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     content = f.read()
@@ -46,24 +99,51 @@ async def main():
                 print(f"  Skipped (empty or too short)")
                 continue
             
-            # Generate embedding
-            embedding = await openai_service.generate_embedding(content)
+            # Create vector ID and metadata; a content digest keeps IDs stable
+            # across runs (unlike the per-process salted hash()) so re-runs upsert in place
+            digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+            pieces = split_for_embedding(content, openai_service.embedding_model)
             
-            # Create vector ID and metadata
-            vector_id = f"{file_path.stem}_{hash(content) % 10000}"
-            metadata = {
-                "text": content[:2000],  # Store first 2000 chars in metadata
-                "source": str(file_path),
-                "type": file_path.stem,
-                "file_type": file_path.suffix
-            }
+            for index, piece in enumerate(pieces):
+                vector_id = f"{file_path.stem}_{digest}"
+                metadata = {
+                    "text": piece[:2000],  # Store first 2000 chars in metadata
+                    "source": str(file_path),
+                    "type": file_path.stem,
+                    "file_type": file_path.suffix
+                }
+                if len(pieces) > 1:
+                    vector_id = f"{vector_id}_{index}"
+                    metadata["chunk_index"] = index
+                    metadata["total_chunks"] = len(pieces)
+                
+                pending.append((vector_id, piece, metadata))
             
-            vectors_to_upsert.append((vector_id, embedding, metadata))
-            print(f"  ✓ Generated embedding ({len(content)} chars)")
+            print(f"  ✓ Loaded ({len(content)} chars, {len(pieces)} piece(s))")
             
         except Exception as e:
             print(f"  ✗ Error: {e}")
     
+    # Embed all files in batched requests instead of one request per file
+    if pending:
+        print(f"\nGenerating embeddings for {len(pending)} pieces...")
+        embeddings = await embed_pending(openai_service, pending)
+        
+        # A file is only stored if every one of its pieces was embedded
+        failed_sources = {
+            metadata["source"]
+            for (_, _, metadata), embedding in zip(pending, embeddings)
+            if embedding is None
+        }
+        vectors_to_upsert = [
+            (vector_id, embedding, metadata)
+            for (vector_id, _, metadata), embedding in zip(pending, embeddings)
+            if metadata["source"] not in failed_sources
+        ]
+        print(f"✓ Generated {len(vectors_to_upsert)} embeddings")
+        if failed_sources:
+            print(f"✗ Skipped {len(failed_sources)} files that failed to embed")
+    
     # Upsert to Pinecone
     if vectors_to_upsert:
         print(f"\nUpserting {len(vectors_to_upsert)} vectors to Pinecone...")